@@ -1,41 +1,18 @@
-import snowflake.connector
-import os
-import pandas as pd
-
-# Snowflake connection details
-SNOWFLAKE_USER = os.getenv("SNOWFLAKE_USER")
-SNOWFLAKE_PASSWORD = os.getenv("SNOWFLAKE_PASSWORD")
-SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT")
-SNOWFLAKE_DATABASE = os.getenv("SNOWFLAKE_DATABASE")
-SNOWFLAKE_SCHEMA = os.getenv("SNOWFLAKE_SCHEMA")
-SNOWFLAKE_WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE")
-SNOWFLAKE_STAGE = os.getenv("SNOWFLAKE_STAGE")
+import argparse
 
-# Connect to Snowflake
-conn = snowflake.connector.connect(
-    user=SNOWFLAKE_USER,
-    password=SNOWFLAKE_PASSWORD,
-    account=SNOWFLAKE_ACCOUNT,
-    warehouse=SNOWFLAKE_WAREHOUSE,
-    database=SNOWFLAKE_DATABASE,
-    schema=SNOWFLAKE_SCHEMA
-)
+import pandas as pd
 
-cursor = conn.cursor()
-print("✅ Connected to Snowflake!")
+from financials_ingest import FINANCIALS_DELTA_DIR, run_ingest
 
 # Use the correctly formatted CSV file
 csv_file_path = "nvidia_pivoted_cleaned_data.csv"
 
-# Upload CSV to Snowflake Stage
-upload_query = f"PUT file://{csv_file_path} @{SNOWFLAKE_STAGE} AUTO_COMPRESS=TRUE"
-
-try:
-    cursor.execute(upload_query)
-    print("✅ Fixed CSV file successfully uploaded to Snowflake stage!")
-except Exception as e:
-    print(f"❌ Error uploading file: {e}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load new or changed CSV rows into NVIDIA_FINANCIALS")
+    parser.add_argument("--csv", default=csv_file_path)
+    parser.add_argument("--delta-dir", default=FINANCIALS_DELTA_DIR)
+    args = parser.parse_args()
 
-# Close the connection
-cursor.close()
-conn.close()
+    # Only the delta is staged (Parquet), COPYed and MERGEd; reruns are no-ops
+    result = run_ingest(pd.read_csv(args.csv), delta_dir=args.delta_dir)
+    print(f"✅ Snowflake load finished: {result}")
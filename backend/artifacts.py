@@ -0,0 +1,143 @@
+# backend/artifacts.py
+import gzip
+import hashlib
+import os
+import re
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from resources import LRUCache, get_or_create
+from telemetry import record_cache
+
+# Artifacts are also written here so report URLs (e.g. in stored report jobs) outlive the memory cache
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+ARTIFACT_CACHE_SIZE = int(os.getenv("ARTIFACT_CACHE_SIZE", "256"))
+# Prefix for artifact URLs in reports; empty keeps them relative to the API
+ARTIFACT_BASE_URL = os.getenv("ARTIFACT_BASE_URL", "").rstrip("/")
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# PNG is already deflated; gzip only pays off for text and uncompressed columns
+COMPRESSIBLE = {"svg", "arrow"}
+# Names are content hashes, so a URL's bytes never change
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_NAME = re.compile(r"^([0-9a-f]{64})\.(png|svg|arrow)$")
+
+
+class ArtifactStore:
+    """
+    Content-addressed binary artifacts: the name is the SHA-256 of the bytes
+    plus an extension, which also serves as the ETag. Recent artifacts (and
+    their gzip encodings) stay in memory; every artifact is kept on disk.
+    """
+
+    def __init__(self, directory: str = ARTIFACT_DIR, cache_size: int = ARTIFACT_CACHE_SIZE):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._cache = LRUCache(cache_size)
+        self._gzipped = LRUCache(cache_size)
+
+    def put(self, data: bytes, ext: str) -> str:
+        if ext not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported artifact type: {ext}")
+        name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        if self._cache.get(name) is None:
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            self._cache.put(name, data)
+        return name
+
+    def get(self, name: str) -> Optional[bytes]:
+        # Only well-formed names ever reach the filesystem
+        if not _NAME.match(name):
+            return None
+        data = self._cache.get(name)
+        record_cache("artifact", data is not None)
+        if data is None:
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            self._cache.put(name, data)
+        return data
+
+    def get_gzipped(self, name: str) -> Optional[bytes]:
+        data = self._gzipped.get(name)
+        if data is None:
+            raw = self.get(name)
+            if raw is None:
+                return None
+            # mtime=0 keeps the encoding byte-identical across processes
+            data = gzip.compress(raw, compresslevel=6, mtime=0)
+            self._gzipped.put(name, data)
+        return data
+
+
+def get_artifact_store() -> ArtifactStore:
+    return get_or_create("artifact_store", ArtifactStore)
+
+def artifact_url(name: str) -> str:
+    return f"{ARTIFACT_BASE_URL}/artifacts/{name}"
+
+def publish(data: bytes, ext: str) -> str:
+    """Store `data` and return the URL reports should reference it by."""
+    return artifact_url(get_artifact_store().put(data, ext))
+
+def table_bytes(df) -> bytes:
+    """A DataFrame as an Arrow IPC stream: typed columns, no per-row keys."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _etag_matches(header: Optional[str], digest: str) -> bool:
+    # Either encoding's tag validates: both are the same content
+    if not header:
+        return False
+    candidates = {tag.strip().replace("W/", "", 1) for tag in header.split(",")}
+    return bool(candidates & {"*", f'"{digest}"', f'"{digest}-gzip"'})
+
+def artifact_response(request: Request, name: str) -> Response:
+    match = _NAME.match(name)
+    if match is None:
+        raise HTTPException(status_code=404, detail="Unknown artifact.")
+    digest, ext = match.groups()
+    gzipped = ext in COMPRESSIBLE and "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"ETag": f'"{digest}-gzip"' if gzipped else f'"{digest}"', "Cache-Control": CACHE_CONTROL,
+               "Vary": "Accept-Encoding"}
+    store = get_artifact_store()
+    if _etag_matches(request.headers.get("if-none-match"), digest):
+        # Only answer 304 for artifacts we actually have
+        if store.get(name) is None:
+            raise HTTPException(status_code=404, detail="Unknown artifact.")
+        return Response(status_code=304, headers=headers)
+
+    if gzipped:
+        body = store.get_gzipped(name)
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = store.get(name)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Unknown artifact.")
+    return Response(content=body, media_type=MEDIA_TYPES[ext], headers=headers)
+
+
+artifact_router = APIRouter()
+
+@artifact_router.get("/artifacts/{name}")
+def get_artifact(name: str, request: Request):
+    # Charts (PNG/SVG) and financial tables (Arrow IPC) referenced by URL from reports
+    return artifact_response(request, name)
@@ -0,0 +1,249 @@
+# backend/benchmarks/report_bench.py
+# End-to-end /report latency with every external service replaced by a local stand-in:
+# NumPy vector store, SQLite NVIDIA_FINANCIALS loaded from the CSV, canned web search,
+# hashing embedder and the fake LLM provider.
+#   python benchmarks/report_bench.py --concurrency 1 4 16 --requests 50 [--llm-latency-ms 300]
+#                                     [--output report_bench.json] [--url http://localhost:8000]
+# Without --url the app is driven in-process over ASGI and per-stage times are reported too;
+# with --url the server must already be running with the same stand-ins configured.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "How did NVIDIA's data center revenue develop?",
+    "What drove NVIDIA's gross margin this quarter?",
+    "Summarize NVIDIA's gaming segment performance.",
+    "What did NVIDIA say about supply constraints?",
+    "How much did NVIDIA return to shareholders?",
+]
+PERIODS = [(2024, 1), (2024, 2), (2024, 3), (2024, 4), (2025, 1)]
+
+CORPUS_SENTENCES = [
+    "Data center revenue for the quarter was a record, up strongly from a year ago on demand for Hopper GPUs.",
+    "Gaming revenue grew sequentially as channel inventory normalised ahead of the holiday season.",
+    "Gross margin expanded on a favourable product mix and lower inventory provisions.",
+    "Supply of advanced packaging remained constrained and is expected to improve through the year.",
+    "The company returned cash to shareholders through share repurchases and quarterly dividends.",
+    "Professional visualization revenue increased on enterprise workstation demand.",
+    "Automotive revenue rose on self-driving platform adoption by new customers.",
+    "Operating expenses increased due to compensation and infrastructure investments.",
+]
+
+
+def configure_environment(workdir: str, llm_latency_ms: float, repeat_questions: bool) -> None:
+    # Must run before any backend module is imported; they read configuration at import time
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_DIR": os.path.join(workdir, "local_index"),
+        "EMBEDDING_BACKEND": "hash",
+        "FINANCIALS_BACKEND": "sqlite",
+        "FINANCIALS_SQLITE_PATH": os.path.join(workdir, "nvidia_financials.db"),
+        "FINANCIALS_CSV_PATH": os.path.join(BACKEND_DIR, "nvidia_pivoted_cleaned_data.csv"),
+        "FINANCIALS_SNAPSHOT_PATH": os.path.join(workdir, "nvidia_financials_snapshot.npz"),
+        "WEB_SEARCH_BACKEND": "local",
+        "RAG_LLM": "fake",
+        "LLM_HEDGING": "false",
+        "FAKE_LLM_LATENCY_MS": str(llm_latency_ms),
+    })
+    if not repeat_questions:
+        # Every request is a new question, so measure the uncached path end to end
+        os.environ["RAG_CACHE_THRESHOLD"] = "1.01"
+    sys.path.insert(0, BACKEND_DIR)
+
+def seed_corpus(chunks_per_quarter: int) -> int:
+    from pinecone_embeds import upsert_embeddings
+    total = 0
+    for year, quarter in PERIODS:
+        chunks = [
+            f"NVIDIA fiscal {year} Q{quarter}, note {i}: {CORPUS_SENTENCES[i % len(CORPUS_SENTENCES)]}"
+            for i in range(chunks_per_quarter)
+        ]
+        total += upsert_embeddings(chunks, {"source": f"NVIDIA_{year}_Q{quarter}.pdf"})["upserted"]
+    return total
+
+
+class StageTimer:
+    """Collects wall time per named stage from any thread."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, name: str, fn: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.samples[name].append(time.perf_counter() - start)
+        return timed
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: {"count": len(s), **latency_summary(s)} for name, s in self.samples.items()}
+
+def instrument(timer: StageTimer) -> None:
+    # Rebind the module-level names the pipeline looks up at call time
+    import rag_agent
+    import report_builder
+    for name, runner in list(report_builder.AGENT_RUNNERS.items()):
+        report_builder.AGENT_RUNNERS[name] = timer.wrap(f"agent.{name}", runner)
+    rag_agent.query_pinecone = timer.wrap("rag.vector_query", rag_agent.query_pinecone)
+    rag_agent.retrieve_context = timer.wrap("rag.retrieve", rag_agent.retrieve_context)
+    rag_agent.get_hedged_llm_response = timer.wrap("rag.llm", rag_agent.get_hedged_llm_response)
+    report_builder.get_quarter_financials = timer.wrap("financial.lookup", report_builder.get_quarter_financials)
+    report_builder.render_metric_chart = timer.wrap("financial.chart", report_builder.render_metric_chart)
+    report_builder.tavily_search = timer.wrap("web.search", report_builder.tavily_search)
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ms = np.asarray(samples) * 1000
+    summary = {f"p{p}_ms": round(float(np.percentile(ms, p)), 2) for p in (50, 95, 99)}
+    summary.update(mean_ms=round(float(ms.mean()), 2), max_ms=round(float(ms.max()), 2))
+    return summary
+
+def build_payload(i: int, agents: List[str], repeat_questions: bool) -> Dict[str, Any]:
+    year, quarter = PERIODS[i % len(PERIODS)]
+    question = QUESTIONS[i % len(QUESTIONS)]
+    if not repeat_questions:
+        question = f"{question} (request {i})"
+    return {"question": question, "year": year, "quarter": quarter, "include_agents": agents}
+
+async def run_level(client, path: str, concurrency: int, requests: int, agents: List[str],
+                    repeat_questions: bool, offset: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+    next_request = iter(range(requests))
+
+    async def worker() -> None:
+        for i in next_request:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=build_payload(offset + i, agents, repeat_questions))
+                if response.status_code != 200:
+                    errors[f"http_{response.status_code}"] += 1
+                    continue
+                for name in response.json().get("missing_agents", {}):
+                    errors[f"missing_{name}"] += 1
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "succeeded": len(latencies),
+        "errors": dict(errors),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency": latency_summary(latencies),
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+async def run(args) -> Dict[str, Any]:
+    import httpx
+
+    timer = StageTimer()
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        seeded = seed_corpus(args.chunks_per_quarter)
+        print(f"Seeded {seeded} chunks into the local index")
+        from app import app
+        from warmup import warm_up
+        # ASGITransport doesn't run the lifespan, so warm up explicitly
+        warm_up()
+        instrument(timer)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                   timeout=args.timeout)
+
+    levels = []
+    offset = 0
+    async with client:
+        await run_level(client, args.path, 1, args.warmup_requests, args.agents, args.repeat_questions, offset)
+        offset += args.warmup_requests
+        for concurrency in args.concurrency:
+            timer.reset()
+            level = await run_level(client, args.path, concurrency, args.requests, args.agents,
+                                    args.repeat_questions, offset)
+            offset += args.requests
+            if not args.url:
+                level["stages"] = timer.summary()
+            levels.append(level)
+            latency = level["latency"]
+            print(f"concurrency {concurrency:>3}: {level['throughput_rps']:>7.2f} req/s  "
+                  f"p50 {latency.get('p50_ms', 0):.1f}ms  p95 {latency.get('p95_ms', 0):.1f}ms  "
+                  f"p99 {latency.get('p99_ms', 0):.1f}ms  errors {sum(level['errors'].values())}")
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "target": args.url or "in-process",
+            "path": args.path,
+            "agents": args.agents,
+            "llm_latency_ms": args.llm_latency_ms,
+            "repeat_questions": args.repeat_questions,
+        },
+        "levels": levels,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=50, help="requests per concurrency level")
+    parser.add_argument("--warmup-requests", type=int, default=5)
+    parser.add_argument("--agents", nargs="+", default=["rag", "financial", "web"])
+    parser.add_argument("--path", default="/report")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--chunks-per-quarter", type=int, default=200)
+    parser.add_argument("--repeat-questions", action="store_true",
+                        help="cycle through a few questions so the caches are exercised")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--workdir", help="where the local index and database go (default: a temp dir)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(args.workdir or tmp, args.llm_latency_ms, args.repeat_questions)
+        results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# backend/benchmarks/startup_bench.py
+# Import-time and cold-start timings, each measured in a fresh interpreter.
+#   python benchmarks/startup_bench.py [--runs 3] [--output startup.json] [--max-import-seconds 2.0]
+# Exits non-zero when the app import exceeds --max-import-seconds, so CI can catch regressions.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["app", "web_search_agent", "report_builder", "rag_agent", "pinecone_embeds", "llm_chat"]
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+COLD_START_SNIPPET = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+from warmup import warm_up
+state = warm_up()
+import json
+print(json.dumps({"import": imported - start, "warm_up": state["seconds"], "total": time.perf_counter() - start,
+                  "ready": state["ready"], "components": state["components"]}))
+"""
+
+def run(snippet: str) -> str:
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--skip-warm-up", action="store_true", help="only measure imports")
+    parser.add_argument("--max-import-seconds", type=float, help="fail if importing app takes longer")
+    args = parser.parse_args()
+
+    results = {"imports": {}}
+    for module in MODULES:
+        samples = [float(run(IMPORT_SNIPPET.format(module=module))) for _ in range(args.runs)]
+        results["imports"][module] = {"median_s": round(statistics.median(samples), 4),
+                                      "max_s": round(max(samples), 4)}
+        print(f"import {module:<18} median {results['imports'][module]['median_s']:.3f}s")
+
+    if not args.skip_warm_up:
+        results["cold_start"] = json.loads(run(COLD_START_SNIPPET))
+        print(f"cold start: import {results['cold_start']['import']:.3f}s + "
+              f"warm-up {results['cold_start']['warm_up']:.3f}s (ready={results['cold_start']['ready']})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_import_seconds is not None and results["imports"]["app"]["median_s"] > args.max_import_seconds:
+        print(f"app import exceeded {args.max_import_seconds}s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
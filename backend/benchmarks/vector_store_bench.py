@@ -0,0 +1,61 @@
+# backend/benchmarks/vector_store_bench.py
+# Query latency of the local NumPy index, optionally side by side with Pinecone.
+#   python benchmarks/vector_store_bench.py --vectors 20000 --queries 200 [--quantize int8] [--pinecone]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_store import LocalVectorStore
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return {f"p{p}": round(float(np.percentile(ms, p)), 3) for p in (50, 95, 99)}
+
+def time_queries(index, queries, top_k):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        index.query(vector=q.tolist(), top_k=top_k, include_metadata=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--quantize", choices=["float32", "int8"], default="float32")
+    parser.add_argument("--pinecone", action="store_true", help="also time the configured Pinecone index")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(args.vectors, args.dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path, quantize=args.quantize)
+        start = time.perf_counter()
+        store.upsert([
+            {"id": f"bench-{i}", "values": row, "metadata": {"chunk_index": i}}
+            for i, row in enumerate(data)
+        ])
+        print(f"local build: {args.vectors} vectors in {time.perf_counter() - start:.2f}s")
+        print(f"local ({args.quantize}) query ms:", percentiles(time_queries(store, queries, args.top_k)))
+
+    if args.pinecone:
+        from pinecone_embeds import get_pinecone_client, INDEX_NAME
+        index = get_pinecone_client().Index(INDEX_NAME)
+        dim = index.describe_index_stats().get("dimension", args.dim)
+        remote_queries = rng.normal(size=(args.queries, dim)).astype(np.float32)
+        print("pinecone query ms:", percentiles(time_queries(index, remote_queries, args.top_k)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# backend/charts.py
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional, Tuple
+
+import numpy as np
+
+from llm_providers import DeadlineExceeded, time_left
+from resources import LRUCache, SingleFlight
+from telemetry import record_cache, span
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "128"))
+CHART_FORMATS = ("png", "svg")
+
+
+# ✅ Renderer (runs inside a worker process; keep it free of module state)
+def render_chart(dates: np.ndarray, values: np.ndarray, metric: str, detailed: bool = True,
+                 fmt: str = "png") -> bytes:
+    import matplotlib
+    matplotlib.use("Agg")
+    # Same data, same bytes: fixed SVG element IDs and no creation date below
+    matplotlib.rcParams["svg.hashsalt"] = "nvidia-charts"
+    import matplotlib.ticker as ticker
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 5) if detailed else None)
+    ax = fig.subplots()
+    ax.plot(dates, values, marker="o", linewidth=2 if detailed else None, color="#007acc" if detailed else None,
+            label=metric)
+
+    if detailed:
+        # Title and axes
+        ax.set_title(f"NVIDIA {metric} Over Time", fontsize=14)
+        ax.set_xlabel("Date", fontsize=12)
+        ax.set_ylabel(metric, fontsize=12)
+        ax.tick_params(axis="x", labelrotation=45)
+        ax.grid(True, linestyle="--", alpha=0.6)
+
+        # Format y-axis with billion/trillion scaling
+        def billions(x, pos):
+            if x >= 1e12:
+                return f"${x*1.0/1e12:.1f}T"
+            elif x >= 1e9:
+                return f"${x*1.0/1e9:.1f}B"
+            else:
+                return f"${x:,.0f}"
+        ax.yaxis.set_major_formatter(ticker.FuncFormatter(billions))
+
+        # Add data labels (labels formatted in one vectorized pass)
+        labels = np.char.add(np.char.mod("%.1f", np.asarray(values, dtype=np.float64) / 1e9), "B")
+        for label, x, y in zip(labels, dates, values):
+            ax.annotate(label, (x, y), textcoords="offset points", xytext=(0, 8),
+                        ha="center", fontsize=8, color="gray")
+    else:
+        ax.set_xlabel("ASOFDATE")
+        ax.legend()
+
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, metadata={"Date": None} if fmt == "svg" else None)
+    return buf.getvalue()
+
+
+def chart_key(dates: np.ndarray, values: np.ndarray, metric: str, detailed: bool, fmt: str = "png") -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{metric}|{int(detailed)}|{fmt}|".encode())
+    digest.update(np.ascontiguousarray(dates, dtype="datetime64[ns]").tobytes())
+    digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class ChartService:
+    """
+    Renders charts off the request thread in a process pool and caches the
+    image bytes by a hash of the plotted data and format. Concurrent requests for the same
+    chart share one render; nothing is written to disk.
+    """
+
+    def __init__(self, workers: int = CHART_WORKERS, cache_size: int = CHART_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._cache = LRUCache(cache_size)
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the API process is multi-threaded
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    def _render(self, dates, values, metric, detailed, fmt) -> bytes:
+        pool = self._get_pool()
+        if pool is None:
+            return render_chart(dates, values, metric, detailed, fmt)
+        # Bounded by the calling agent's deadline, if any
+        timeout = time_left(None)
+        future = None
+        try:
+            future = pool.submit(render_chart, dates, values, metric, detailed, fmt)
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise DeadlineExceeded(f"chart render for {metric} ran past the deadline")
+        except Exception as e:
+            print(f"Chart worker failed, rendering in-thread: {e}")
+            self._discard_pool(pool)
+            return render_chart(dates, values, metric, detailed, fmt)
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            # Concurrent failures of the same pool replace it once
+            if self._pool is pool:
+                self._pool = None
+        # Reap the old pool's processes and management thread instead of leaking them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def render(self, dates: np.ndarray, values: np.ndarray, metric: str = "MARKETCAP",
+               detailed: bool = True, fmt: str = "png") -> Tuple[str, bytes]:
+        if fmt not in CHART_FORMATS:
+            raise ValueError(f"Unsupported chart format: {fmt}")
+        key = chart_key(dates, values, metric, detailed, fmt)
+        image = self.get(key)
+        record_cache("chart", image is not None)
+        if image is not None:
+            return key, image
+
+        def render() -> bytes:
+            with span("chart_render", metric=metric, format=fmt):
+                image = self._render(dates, values, metric, detailed, fmt)
+            self._cache.put(key, image)
+            return image
+
+        return key, self._flight.do(key, render)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+chart_service = ChartService()
+
+def render_metric_chart(df, metric: str = "MARKETCAP", detailed: bool = True,
+                        fmt: str = "png") -> Tuple[str, bytes]:
+    """Render `metric` over ASOFDATE for a financials frame; returns (data hash, PNG or SVG bytes)."""
+    df = df.sort_values("ASOFDATE")
+    dates = df["ASOFDATE"].astype("datetime64[ns]").to_numpy()
+    values = df[metric].to_numpy(dtype=np.float64)
+    return chart_service.render(dates, values, metric, detailed, fmt)
@@ -0,0 +1,107 @@
+# backend/context_packer.py
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from llm_chat import count_tokens
+
+# Prompt budget for retrieved context, and cosine similarity above which two chunks count as duplicates
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "6000"))
+DEDUP_SIMILARITY = float(os.getenv("RAG_DEDUP_SIMILARITY", "0.95"))
+
+
+# Candidates whose vectors are fetched per round trip when matches arrive without values
+VECTOR_FETCH_WINDOW = int(os.getenv("RAG_VECTOR_FETCH_WINDOW", "64"))
+
+
+def match_text(match: Dict[str, Any]) -> str:
+    # Vectors ingested before the document store carry their text in metadata
+    return match.get("metadata", {}).get("text", "") or match.get("text", "")
+
+def match_tokens(match: Dict[str, Any], model: str) -> int:
+    tokens = match.get("metadata", {}).get("tokens")
+    return int(tokens) if tokens is not None else count_tokens(match_text(match), model)
+
+def _unit(vector) -> Optional[np.ndarray]:
+    if vector is None or len(vector) == 0:
+        return None
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else None
+
+def pack_context(matches: List[Dict[str, Any]], model: str, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 dedup_similarity: float = DEDUP_SIMILARITY,
+                 fetch_values: Optional[Callable[[List[str]], Dict[str, Any]]] = None,
+                 fetch_texts: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Pick chunks in descending score order until `token_budget` is spent.
+    A chunk is skipped when its text hash was already taken or its embedding
+    is within `dedup_similarity` of a chunk already taken. Budgeting uses the
+    token count stored in metadata, and embeddings come from the match's
+    "values" or, in windows, from `fetch_values(ids)`; text is read only for
+    the chosen chunks, in one `fetch_texts(ids)` call. Returns the chunks and
+    counters for logging.
+    """
+    ranked = sorted(matches, key=lambda m: m.get("score", 0.0), reverse=True)
+    selected: List[Dict[str, Any]] = []
+    kept_vectors: List[np.ndarray] = []
+    seen = set()
+    fetched: Dict[str, Any] = {}
+    fetched_upto = 0
+    stats = {"candidates": len(ranked), "duplicates": 0, "over_budget": 0, "tokens": 0, "fetched_vectors": 0}
+
+    for pos, match in enumerate(ranked):
+        key = match.get("metadata", {}).get("text_hash") or match_text(match).strip()
+        if not key or key in seen:
+            stats["duplicates"] += bool(key)
+            continue
+
+        tokens = match_tokens(match, model)
+        if stats["tokens"] + tokens > token_budget:
+            # A shorter, lower-ranked chunk may still fit
+            stats["over_budget"] += 1
+            continue
+
+        values = match.get("values")
+        if not values and fetch_values is not None:
+            if pos >= fetched_upto:
+                window = [m.get("id") for m in ranked[pos:pos + VECTOR_FETCH_WINDOW] if not m.get("values")]
+                fetched.update(fetch_values(window))
+                fetched_upto = pos + VECTOR_FETCH_WINDOW
+                stats["fetched_vectors"] += len(window)
+            values = fetched.get(match.get("id"))
+        vector = _unit(values)
+        if vector is not None and kept_vectors:
+            if float(np.max(np.stack(kept_vectors) @ vector)) >= dedup_similarity:
+                stats["duplicates"] += 1
+                continue
+
+        selected.append(match)
+        seen.add(key)
+        if vector is not None:
+            kept_vectors.append(vector)
+        stats["tokens"] += tokens
+
+    missing = [m.get("id") for m in selected if not match_text(m)]
+    texts = fetch_texts(missing) if missing and fetch_texts is not None else {}
+    chunks = [text for text in ((match_text(m) or texts.get(m.get("id"), "")).strip() for m in selected) if text]
+    stats["missing_text"] = len(selected) - len(chunks)
+    return chunks, stats
+
+def group_chunks(chunks: List[str], model: str, token_budget: int) -> List[List[str]]:
+    """Split ranked chunks into consecutive groups of at most `token_budget` tokens each."""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk, model)
+        if current and used + tokens > token_budget:
+            groups.append(current)
+            current, used = [], 0
+        # A chunk larger than the budget still gets a group of its own
+        current.append(chunk)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,58 @@
+# backend/document_store.py
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+DOCUMENT_STORE_PATH = os.getenv("DOCUMENT_STORE_PATH", "document_store.db")
+# SQLite's default limit on bound parameters is 999 on older builds
+_FETCH_BATCH = 900
+
+
+class DocumentStore:
+    """
+    Chunk text keyed by vector ID ("{source}-{i}"), kept next to the app
+    instead of in vector metadata. Queries return IDs; the text for the
+    chunks that survive dedup and the token budget is read here in bulk.
+    """
+
+    def __init__(self, path: str = DOCUMENT_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id TEXT PRIMARY KEY, source TEXT, chunk_index INTEGER, text_hash TEXT, text TEXT NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers run alongside an ingest
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path)
+        return conn
+
+    def put_many(self, rows: Iterable[Tuple[str, str, int, str, str]]) -> int:
+        """Insert or replace (id, source, chunk_index, text_hash, text) rows."""
+        rows = list(rows)
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, source, chunk_index, text_hash, text) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def get_many(self, ids: List[str]) -> Dict[str, str]:
+        texts: Dict[str, str] = {}
+        conn = self._connection()
+        for start in range(0, len(ids), _FETCH_BATCH):
+            batch = ids[start:start + _FETCH_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            texts.update(conn.execute(f"SELECT id, text FROM chunks WHERE id IN ({placeholders})", batch))
+        return texts
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
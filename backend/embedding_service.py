@@ -0,0 +1,146 @@
+# backend/embedding_service.py
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from telemetry import record_cache
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+
+
+class EmbeddingService:
+    """
+    Micro-batching front end for a SentenceTransformer.
+    Concurrent encode() calls are queued; a single worker waits up to
+    `max_wait_ms` after the first request for more to arrive, then encodes
+    up to `max_batch` texts in one forward pass. Recent query vectors are
+    kept in an LRU cache so repeated questions skip the model entirely.
+    """
+
+    def __init__(self, load_model: Callable[[], Any], max_batch: int = EMBED_MAX_BATCH,
+                 max_wait_ms: float = EMBED_MAX_WAIT_MS, cache_size: int = EMBED_CACHE_SIZE):
+        self.load_model = load_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache_size = cache_size
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self.batches = 0
+        self.encoded = 0
+
+    def _cached(self, text: str) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+            return vector
+
+    def _remember(self, text: str, vector: np.ndarray) -> None:
+        with self._cache_lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            # Identical texts in the same window are encoded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = self.load_model().encode(texts, batch_size=len(texts), convert_to_numpy=True)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.encoded += len(texts)
+            by_text = dict(zip(texts, vectors))
+            for text, vector in by_text.items():
+                self._remember(text, vector)
+            for text, future in batch:
+                future.set_result(by_text[text])
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        vector = self._cached(text)
+        record_cache("embedding", vector is not None)
+        if vector is not None:
+            return vector
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout=timeout)
+
+    def prime(self, texts: List[str]) -> int:
+        """Encode the uncached texts in one forward pass so later encode() calls are cache hits."""
+        missing = [t for t in dict.fromkeys(texts) if self._cached(t) is None]
+        if missing:
+            vectors = self.load_model().encode(missing, batch_size=self.max_batch, convert_to_numpy=True)
+            for text, vector in zip(missing, vectors):
+                self._remember(text, vector)
+        return len(missing)
+
+    def encode_many(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        # Bulk callers (ingestion) already have a batch; go straight to the model
+        return self.load_model().encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "encoded": self.encoded, "cached": len(self._cache),
+                "avg_batch": round(self.encoded / self.batches, 2) if self.batches else 0.0}
+
+
+class HashingEmbedder:
+    """
+    Deterministic stand-in for SentenceTransformer (EMBEDDING_BACKEND=hash):
+    hashed word unigrams projected into `dim` buckets and L2-normalised.
+    Texts sharing words land close together, which is enough for offline runs.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            digest = zlib.crc32(word.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            return self._embed(texts)
+        return np.stack([self._embed(t) for t in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
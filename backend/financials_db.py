@@ -0,0 +1,238 @@
+# backend/financials_db.py
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from telemetry import record_cache, span
+
+load_dotenv()
+
+TABLE_NAME = "NVIDIA_FINANCIALS"
+
+# Quarter lookups with bind parameters (never f-strings) for each supported backend
+SNOWFLAKE_QUARTER_SQL = (
+    f"SELECT * FROM {TABLE_NAME} "
+    "WHERE YEAR(ASOFDATE) = %(year)s AND QUARTER(ASOFDATE) = %(quarter)s"
+)
+SQLITE_QUARTER_SQL = (
+    f"SELECT * FROM {TABLE_NAME} "
+    "WHERE CAST(strftime('%Y', ASOFDATE) AS INTEGER) = :year "
+    "AND (CAST(strftime('%m', ASOFDATE) AS INTEGER) + 2) / 3 = :quarter"
+)
+# Rows newer than a given date, for incremental snapshot refreshes
+SNOWFLAKE_SINCE_SQL = f"SELECT * FROM {TABLE_NAME} WHERE ASOFDATE > %(since)s ORDER BY ASOFDATE"
+SQLITE_SINCE_SQL = f"SELECT * FROM {TABLE_NAME} WHERE ASOFDATE > :since ORDER BY ASOFDATE"
+
+# CSV headers (yahooquery names) -> warehouse column names
+CSV_COLUMN_MAP = {
+    "asOfDate": "ASOFDATE",
+    "EnterpriseValue": "ENTERPRISEVALUE",
+    "EnterprisesValueEBITDARatio": "ENTERPRISESVALUEEBITDARATIO",
+    "EnterprisesValueRevenueRatio": "ENTERPRISESVALUEREVENUERATIO",
+    "ForwardPeRatio": "FORWARDPERATIO",
+    "MarketCap": "MARKETCAP",
+    "PbRatio": "PBRATIO",
+    "PeRatio": "PERATIO",
+    "PegRatio": "PEGRATIO",
+    "PsRatio": "PSRATIO",
+}
+
+# ✅ Connection factories
+def snowflake_connect():
+    import snowflake.connector
+
+    return snowflake.connector.connect(
+        user=os.getenv("SNOWFLAKE_USER"),
+        password=os.getenv("SNOWFLAKE_PASSWORD"),
+        account=os.getenv("SNOWFLAKE_ACCOUNT"),
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+        database=os.getenv("SNOWFLAKE_DATABASE"),
+        schema=os.getenv("SNOWFLAKE_SCHEMA"),
+        client_session_keep_alive=True,
+    )
+
+def sqlite_connect(path: str = ":memory:"):
+    # Pooled connections move between worker threads
+    return sqlite3.connect(path, check_same_thread=False)
+
+def sqlite_table_exists(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def load_csv_into_sqlite(conn, csv_path: str) -> int:
+    """Create NVIDIA_FINANCIALS in a SQLite stand-in from the pivoted CSV."""
+    df = pd.read_csv(csv_path).rename(columns=CSV_COLUMN_MAP)
+    df["ASOFDATE"] = pd.to_datetime(df["ASOFDATE"]).dt.strftime("%Y-%m-%d %H:%M:%S")
+    df.to_sql(TABLE_NAME, conn, if_exists="replace", index=False)
+    conn.commit()
+    return len(df)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections.
+    Idle connections are health-checked before reuse once they have sat
+    unused for `check_after` seconds; broken ones are closed and replaced.
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_size: int = 4, acquire_timeout: float = 30.0,
+                 check_after: float = 30.0, health_check_sql: str = "SELECT 1"):
+        self.connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.check_after = check_after
+        self.health_check_sql = health_check_sql
+        self._idle: "queue.LifoQueue[Tuple[float, Any]]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            cur = conn.cursor()
+            cur.execute(self.health_check_sql)
+            cur.fetchall()
+            cur.close()
+            return True
+        except Exception as e:
+            print(f"Discarding unhealthy connection: {e}")
+            return False
+
+    def _checkout(self):
+        while True:
+            try:
+                released_at, conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            if time.monotonic() - released_at < self.check_after or self._is_healthy(conn):
+                return conn
+            self._close(conn)
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No database connection available within {self.acquire_timeout:g}s")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            # The connection may be in a bad state; don't hand it to the next caller
+            if conn is not None:
+                self._close(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put((time.monotonic(), conn))
+            self._slots.release()
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(conn)
+
+
+class FinancialsRepository:
+    """Parameterized NVIDIA_FINANCIALS queries with a per-(year, quarter) result cache."""
+
+    def __init__(self, pool: ConnectionPool, quarter_sql: str = SNOWFLAKE_QUARTER_SQL,
+                 since_sql: str = SNOWFLAKE_SINCE_SQL):
+        self.pool = pool
+        self.quarter_sql = quarter_sql
+        self.since_sql = since_sql
+        self._cache: Dict[Tuple[int, int], pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    def query(self, sql: str, params: Optional[Any] = None) -> pd.DataFrame:
+        with span("financials_query"), self.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                if params is None:
+                    cur.execute(sql)
+                else:
+                    cur.execute(sql, params)
+                rows = cur.fetchall()
+                columns = [col[0] for col in cur.description] if cur.description else []
+            finally:
+                cur.close()
+        return pd.DataFrame(rows, columns=columns)
+
+    def get_quarter(self, year: int, quarter: int) -> pd.DataFrame:
+        key = (int(year), int(quarter))
+        cached = self._cache.get(key)
+        record_cache("financials_quarter", cached is not None)
+        if cached is None:
+            cached = self.query(self.quarter_sql, {"year": key[0], "quarter": key[1]})
+            with self._lock:
+                self._cache[key] = cached
+        # Callers sort and mutate frames; hand out copies
+        return cached.copy()
+
+    def get_since(self, since: Optional[str] = None) -> pd.DataFrame:
+        # since is an ISO "YYYY-MM-DD HH:MM:SS" timestamp; None fetches the whole table
+        if since is None:
+            return self.query(f"SELECT * FROM {TABLE_NAME} ORDER BY ASOFDATE")
+        return self.query(self.since_sql, {"since": since})
+
+    def invalidate(self, year: Optional[int] = None, quarter: Optional[int] = None) -> None:
+        with self._lock:
+            if year is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == year and (quarter is None or k[1] == quarter)]:
+                    del self._cache[key]
+
+
+_repository: Optional[FinancialsRepository] = None
+_repository_lock = threading.Lock()
+
+def build_repository() -> FinancialsRepository:
+    # FINANCIALS_BACKEND=sqlite serves a local stand-in loaded from the CSV
+    backend = os.getenv("FINANCIALS_BACKEND", "snowflake").lower()
+    pool_size = int(os.getenv("FINANCIALS_POOL_SIZE", "4"))
+    if backend == "sqlite":
+        path = os.getenv("FINANCIALS_SQLITE_PATH", "nvidia_financials.db")
+        csv_path = os.getenv("FINANCIALS_CSV_PATH", "nvidia_pivoted_cleaned_data.csv")
+        conn = sqlite_connect(path)
+        # Seed once: every API worker builds a repository, and ingestion keeps the table current after that
+        if not sqlite_table_exists(conn, TABLE_NAME):
+            load_csv_into_sqlite(conn, csv_path)
+        conn.close()
+        pool = ConnectionPool(lambda: sqlite_connect(path), max_size=pool_size)
+        return FinancialsRepository(pool, SQLITE_QUARTER_SQL, SQLITE_SINCE_SQL)
+    pool = ConnectionPool(snowflake_connect, max_size=pool_size)
+    return FinancialsRepository(pool, SNOWFLAKE_QUARTER_SQL, SNOWFLAKE_SINCE_SQL)
+
+def get_repository() -> FinancialsRepository:
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = build_repository()
+    return _repository
+
+def set_repository(repository: Optional[FinancialsRepository]) -> None:
+    # Lets tests and local runs swap in a stand-in backend
+    global _repository
+    with _repository_lock:
+        _repository = repository
+
+def invalidate_financials(year: Optional[int] = None, quarter: Optional[int] = None) -> None:
+    # Hook for ingestion jobs once new rows land in the warehouse; nothing is cached before first use
+    if _repository is not None:
+        _repository.invalidate(year, quarter)
@@ -0,0 +1,181 @@
+# backend/financials_ingest.py
+# Incremental NVIDIA_FINANCIALS ingestion:
+#   fetch valuation measures -> diff against the warehouse by ASOFDATE -> write the delta as Parquet
+#   -> bulk-load it (Snowflake stage + COPY + MERGE, or the SQLite stand-in) -> refresh serving caches.
+#   python financials_ingest.py [--csv nvidia_pivoted_cleaned_data.csv] [--delta-dir financials_deltas]
+import argparse
+import hashlib
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from financials_db import CSV_COLUMN_MAP, TABLE_NAME, FinancialsRepository, get_repository, invalidate_financials
+from financials_snapshot import snapshot_store
+from telemetry import span
+
+load_dotenv()
+
+FINANCIALS_SYMBOL = os.getenv("FINANCIALS_SYMBOL", "NVDA")
+FINANCIALS_DELTA_DIR = os.getenv("FINANCIALS_DELTA_DIR", "financials_deltas")
+SNOWFLAKE_STAGE = os.getenv("SNOWFLAKE_STAGE")
+
+DATE_COLUMN = "ASOFDATE"
+METRIC_COLUMNS = [name for name in CSV_COLUMN_MAP.values() if name != DATE_COLUMN]
+
+
+def fetch_valuation_measures(symbol: str = FINANCIALS_SYMBOL) -> pd.DataFrame:
+    # Imported here so the API never pays for yahooquery
+    from yahooquery import Ticker
+    return pd.DataFrame(Ticker(symbol).valuation_measures)
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Warehouse-shaped frame: ASOFDATE plus float metric columns, one row per date."""
+    df = df.reset_index(drop=True).rename(columns=CSV_COLUMN_MAP)
+    df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
+    columns = [DATE_COLUMN] + [name for name in METRIC_COLUMNS if name in df.columns]
+    df = df[columns].copy()
+    for name in columns[1:]:
+        df[name] = pd.to_numeric(df[name], errors="coerce")
+    # yahooquery can report a date under several period types; the latest row wins
+    return df.drop_duplicates(DATE_COLUMN, keep="last").sort_values(DATE_COLUMN).reset_index(drop=True)
+
+def compute_delta(fresh: pd.DataFrame, existing: pd.DataFrame) -> pd.DataFrame:
+    """Rows of `fresh` whose ASOFDATE is new or whose metrics differ from `existing`."""
+    if existing.empty:
+        return fresh
+    merged = fresh.merge(existing, on=DATE_COLUMN, how="left", suffixes=("", "__old"), indicator=True)
+    changed = merged["_merge"] == "left_only"
+    for name in fresh.columns:
+        if name == DATE_COLUMN or f"{name}__old" not in merged.columns:
+            continue
+        new, old = merged[name].to_numpy(np.float64), merged[f"{name}__old"].to_numpy(np.float64)
+        changed |= ~np.isclose(new, old, rtol=1e-9, atol=0.0, equal_nan=True)
+    return fresh[changed.to_numpy()].reset_index(drop=True)
+
+def affected_quarters(delta: pd.DataFrame) -> Set[Tuple[int, int]]:
+    dates = delta[DATE_COLUMN]
+    return set(zip(dates.dt.year.tolist(), ((dates.dt.month - 1) // 3 + 1).tolist()))
+
+def write_delta(delta: pd.DataFrame, directory: str = FINANCIALS_DELTA_DIR) -> str:
+    """Write the delta as zstd-compressed Parquet, named by content so reruns reuse the same file."""
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256(pd.util.hash_pandas_object(delta, index=False).to_numpy().tobytes()).hexdigest()[:16]
+    path = os.path.join(directory, f"{TABLE_NAME.lower()}_delta_{digest}.parquet")
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        # Microsecond timestamps load cleanly into Snowflake TIMESTAMP_NTZ
+        delta.to_parquet(tmp_path, index=False, compression="zstd",
+                         coerce_timestamps="us", allow_truncated_timestamps=True)
+        os.replace(tmp_path, path)
+    return path
+
+
+class SqliteLoader:
+    """Local stand-in for the bulk-load path: replace rows by ASOFDATE inside one transaction."""
+
+    def __init__(self, repository: FinancialsRepository):
+        self.repository = repository
+
+    def load(self, path: str) -> int:
+        delta = pd.read_parquet(path)
+        delta[DATE_COLUMN] = delta[DATE_COLUMN].dt.strftime("%Y-%m-%d %H:%M:%S")
+        with self.repository.pool.connection() as conn:
+            with conn:
+                conn.executemany(f"DELETE FROM {TABLE_NAME} WHERE {DATE_COLUMN} = ?",
+                                 [(d,) for d in delta[DATE_COLUMN]])
+                delta.to_sql(TABLE_NAME, conn, if_exists="append", index=False)
+        return len(delta)
+
+
+class SnowflakeLoader:
+    """
+    PUT the Parquet file to the stage, COPY it into a temporary table and
+    MERGE on ASOFDATE. PUT skips a file already staged under the same
+    (content-derived) name, and MERGE makes repeated loads a no-op.
+    """
+
+    def __init__(self, repository: FinancialsRepository, stage: Optional[str] = SNOWFLAKE_STAGE):
+        if not stage:
+            raise ValueError("SNOWFLAKE_STAGE is not set in the environment.")
+        self.repository = repository
+        self.stage = stage
+
+    def statements(self, path: str, columns: List[str]) -> List[str]:
+        staging = f"{TABLE_NAME}_DELTA"
+        metrics = [name for name in columns if name != DATE_COLUMN]
+        updates = ", ".join(f"t.{name} = s.{name}" for name in metrics)
+        return [
+            f"PUT file://{os.path.abspath(path)} @{self.stage} AUTO_COMPRESS=FALSE OVERWRITE=FALSE",
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} LIKE {TABLE_NAME}",
+            f"TRUNCATE TABLE {staging}",
+            # FORCE: the staging table is empty per load, so COPY's own load history must not skip the file
+            f"COPY INTO {staging} FROM @{self.stage}/{os.path.basename(path)} "
+            "FILE_FORMAT = (TYPE = PARQUET) MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE FORCE = TRUE",
+            f"MERGE INTO {TABLE_NAME} t USING {staging} s ON t.{DATE_COLUMN} = s.{DATE_COLUMN} "
+            f"WHEN MATCHED THEN UPDATE SET {updates} "
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join('s.' + c for c in columns)})",
+        ]
+
+    def load(self, path: str) -> int:
+        columns = list(pd.read_parquet(path).columns)
+        with self.repository.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                for statement in self.statements(path, columns):
+                    cur.execute(statement)
+                merged = cur.fetchone()
+            finally:
+                cur.close()
+        # MERGE reports (rows inserted, rows updated)
+        return int(sum(merged)) if merged else 0
+
+def build_loader(repository: Optional[FinancialsRepository] = None):
+    repository = repository or get_repository()
+    if os.getenv("FINANCIALS_BACKEND", "snowflake").lower() == "sqlite":
+        return SqliteLoader(repository)
+    return SnowflakeLoader(repository)
+
+
+def run_ingest(fresh: Optional[pd.DataFrame] = None, repository: Optional[FinancialsRepository] = None,
+               loader=None, delta_dir: str = FINANCIALS_DELTA_DIR) -> Dict[str, int]:
+    """
+    Load new or changed rows only, then push them to the serving caches.
+    Safe to rerun: an unchanged source produces an empty delta, and a repeated
+    delta overwrites rows with identical values.
+    """
+    repository = repository or get_repository()
+    loader = loader or build_loader(repository)
+    with span("financials_ingest") as attributes:
+        fresh = normalize(fetch_valuation_measures() if fresh is None else fresh)
+        existing = repository.get_since(None)
+        existing = normalize(existing) if not existing.empty else existing
+        delta = compute_delta(fresh, existing)
+        attributes.update(fetched=len(fresh), delta=len(delta))
+        if delta.empty:
+            print(f"{TABLE_NAME} is up to date ({len(fresh)} rows checked).")
+            return {"fetched": len(fresh), "delta": 0, "loaded": 0}
+
+        path = write_delta(delta, delta_dir)
+        loaded = loader.load(path)
+        print(f"Loaded {loaded} new or changed rows into {TABLE_NAME} from {path}.")
+
+        # Serving caches: merge into the columnar snapshot, drop cached quarter queries. API processes
+        # see the replaced snapshot file on their next lookup and drop their own cached queries then
+        snapshot_store.apply(delta)
+        for year, quarter in sorted(affected_quarters(delta)):
+            invalidate_financials(year, quarter)
+        return {"fetched": len(fresh), "delta": len(delta), "loaded": loaded}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", help="ingest this pivoted CSV instead of fetching from yahooquery")
+    parser.add_argument("--delta-dir", default=FINANCIALS_DELTA_DIR)
+    args = parser.parse_args()
+    fresh = pd.read_csv(args.csv) if args.csv else None
+    print(run_ingest(fresh, delta_dir=args.delta_dir))
+
+if __name__ == "__main__":
+    main()
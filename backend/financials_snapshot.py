@@ -0,0 +1,226 @@
+# backend/financials_snapshot.py
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from financials_db import CSV_COLUMN_MAP, get_repository, invalidate_financials
+from telemetry import span
+
+SNAPSHOT_PATH = os.getenv("FINANCIALS_SNAPSHOT_PATH", "nvidia_financials_snapshot.npz")
+SNAPSHOT_CSV_PATH = os.getenv("FINANCIALS_CSV_PATH", "nvidia_pivoted_cleaned_data.csv")
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv("FINANCIALS_SNAPSHOT_REFRESH_SECONDS", "3600"))
+
+
+class FinancialsSnapshot:
+    """
+    Immutable, date-sorted columnar copy of NVIDIA_FINANCIALS.
+    Each metric is a float64 NumPy array; (year, quarter) maps to a contiguous
+    slice of those arrays, so a quarter lookup is a dict hit plus array views.
+    """
+
+    def __init__(self, dates: np.ndarray, columns: Dict[str, np.ndarray]):
+        order = np.argsort(dates, kind="stable")
+        self.dates = np.asarray(dates, dtype="datetime64[ns]")[order]
+        self.columns = {name: np.asarray(values, dtype=np.float64)[order] for name, values in columns.items()}
+        self.years = self.dates.astype("datetime64[Y]").astype(np.int64) + 1970
+        self.quarters = self.dates.astype("datetime64[M]").astype(np.int64) % 12 // 3 + 1
+
+        # (year, quarter) -> (start, stop); rows are date-sorted so each quarter is contiguous
+        self._quarter_index: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        for i, key in enumerate(zip(self.years.tolist(), self.quarters.tolist())):
+            start, _ = self._quarter_index.get(key, (i, i))
+            self._quarter_index[key] = (start, i + 1)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @classmethod
+    def empty(cls) -> "FinancialsSnapshot":
+        return cls(np.array([], dtype="datetime64[ns]"), {})
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "FinancialsSnapshot":
+        df = df.rename(columns=CSV_COLUMN_MAP)
+        dates = pd.to_datetime(df["ASOFDATE"]).to_numpy(dtype="datetime64[ns]")
+        columns = {
+            name: pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+            for name in df.columns if name != "ASOFDATE"
+        }
+        return cls(dates, columns)
+
+    @classmethod
+    def load(cls, path: str) -> "FinancialsSnapshot":
+        with np.load(path) as data:
+            columns = {key[4:]: data[key] for key in data.files if key.startswith("col_")}
+            return cls(data["dates"], columns)
+
+    def save(self, path: str) -> None:
+        # Write to a temp file first so readers never see a half-written snapshot
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, dates=self.dates, **{f"col_{name}": values for name, values in self.columns.items()})
+        os.replace(tmp_path, path)
+
+    @property
+    def latest_date(self) -> Optional[np.datetime64]:
+        return self.dates[-1] if len(self.dates) else None
+
+    def quarter_slice(self, year: int, quarter: int) -> slice:
+        start, stop = self._quarter_index.get((int(year), int(quarter)), (0, 0))
+        return slice(start, stop)
+
+    def range_slice(self, start: Optional[str] = None, end: Optional[str] = None) -> slice:
+        # Inclusive date range via binary search on the sorted date column
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "ns"), side="left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "ns"), side="right"))
+        return slice(lo, hi)
+
+    def columns_at(self, rows: slice) -> Dict[str, np.ndarray]:
+        out = {"ASOFDATE": self.dates[rows]}
+        out.update({name: values[rows] for name, values in self.columns.items()})
+        return out
+
+    def quarter(self, year: int, quarter: int) -> Dict[str, np.ndarray]:
+        return self.columns_at(self.quarter_slice(year, quarter))
+
+    def to_frame(self, rows: slice = slice(None)) -> pd.DataFrame:
+        return pd.DataFrame(self.columns_at(rows))
+
+    def quarter_frame(self, year: int, quarter: int) -> pd.DataFrame:
+        return self.to_frame(self.quarter_slice(year, quarter))
+
+    def merge(self, df: pd.DataFrame) -> "FinancialsSnapshot":
+        """Return a new snapshot with the rows in `df` added or replacing rows with the same date."""
+        if df.empty:
+            return self
+        incoming = FinancialsSnapshot.from_frame(df)
+        keep = ~np.isin(self.dates, incoming.dates)
+        names = list(dict.fromkeys(list(self.columns) + list(incoming.columns)))
+        nan_old = np.full(int(keep.sum()), np.nan)
+        nan_new = np.full(len(incoming), np.nan)
+        columns = {
+            name: np.concatenate([
+                self.columns[name][keep] if name in self.columns else nan_old,
+                incoming.columns.get(name, nan_new),
+            ])
+            for name in names
+        }
+        return FinancialsSnapshot(np.concatenate([self.dates[keep], incoming.dates]), columns)
+
+
+class SnapshotStore:
+    """
+    Holds the current snapshot and swaps in refreshed copies atomically.
+    The snapshot file is the signal between processes: when another process
+    (e.g. financials_ingest) replaces it, the next get() loads the new copy.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH, csv_path: str = SNAPSHOT_CSV_PATH,
+                 refresh_seconds: float = SNAPSHOT_REFRESH_SECONDS):
+        self.path = path
+        self.csv_path = csv_path
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[FinancialsSnapshot] = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # (inode, mtime) of the snapshot file this process last loaded or wrote
+        self._version: Optional[Tuple[int, int]] = None
+
+    def _file_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        # save() replaces the file, so the inode changes even within one mtime tick
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load_initial(self) -> FinancialsSnapshot:
+        version = self._file_version()
+        if version is not None:
+            self._version = version
+            return FinancialsSnapshot.load(self.path)
+        if os.path.exists(self.csv_path):
+            return FinancialsSnapshot.from_frame(pd.read_csv(self.csv_path))
+        return FinancialsSnapshot.empty()
+
+    def get(self) -> FinancialsSnapshot:
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load_initial()
+                    self._refreshed_at = time.monotonic()
+        else:
+            version = self._file_version()
+            if version is not None and version != self._version:
+                self._reload(version)
+            elif time.monotonic() - self._refreshed_at > self.refresh_seconds:
+                self.refresh_in_background()
+        return self._snapshot
+
+    def _reload(self, version: Tuple[int, int]) -> None:
+        with self._lock:
+            if version == self._version:
+                return
+            self._version = version
+            try:
+                self._snapshot = FinancialsSnapshot.load(self.path)
+            except Exception as e:
+                # Keep serving the old copy; the next replacement of the file is picked up again
+                print(f"Failed to reload financials snapshot from {self.path}: {e}")
+                return
+            self._refreshed_at = time.monotonic()
+        print(f"Reloaded financials snapshot written by another process ({len(self._snapshot)} rows).")
+        # Quarter queries cached in this process may predate the new rows
+        invalidate_financials()
+
+    def refresh(self) -> int:
+        """Pull rows newer than the latest snapshot date from the warehouse; returns rows merged."""
+        current = self.get()
+        since = None
+        if current.latest_date is not None:
+            since = pd.Timestamp(current.latest_date).strftime("%Y-%m-%d %H:%M:%S")
+        delta = get_repository().get_since(since)
+        self.apply(delta)
+        return len(delta)
+
+    def apply(self, delta: pd.DataFrame) -> None:
+        # Also used by ingestion to push freshly loaded rows without a warehouse round trip
+        with self._lock:
+            current = self._snapshot or self._load_initial()
+            updated = current.merge(delta)
+            if updated is not current:
+                updated.save(self.path)
+                self._version = self._file_version()
+            self._snapshot = updated
+            self._refreshed_at = time.monotonic()
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Financials snapshot refresh failed: {e}")
+            # Back off until the next interval rather than retrying on every lookup
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._refreshing = False
+
+    def refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+
+snapshot_store = SnapshotStore()
+
+def get_snapshot() -> FinancialsSnapshot:
+    return snapshot_store.get()
+
+def get_quarter_financials(year: int, quarter: int) -> pd.DataFrame:
+    with span("financials_snapshot"):
+        return get_snapshot().quarter_frame(year, quarter)
@@ -0,0 +1,74 @@
+# backend/ingest_manifest.py
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "ingest_manifest.json")
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """
+    Local record of which vector IDs are indexed and the hash of the chunk
+    text behind each one. Every successful batch is appended to a journal
+    (`<path>.log`, one JSON object per line), so it doubles as the resume
+    checkpoint at a cost proportional to the batch: unchanged chunks are
+    skipped on the next run and failed batches are retried. Loading replays
+    the journal and compacts it back into the JSON snapshot at `path`.
+    """
+
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        self.path = path
+        self.journal_path = f"{path}.log"
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._hashes = json.load(f)
+        if os.path.exists(self.journal_path):
+            self._replay()
+            self._compact()
+
+    def _replay(self) -> None:
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self._hashes.update(json.loads(line))
+                except json.JSONDecodeError:
+                    # A batch cut off mid-write by a crash; its chunks are simply ingested again
+                    print(f"Ignoring incomplete entry in {self.journal_path}")
+
+    def _compact(self) -> None:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._hashes, f)
+        os.replace(tmp_path, self.path)
+        # Only after the snapshot holds every entry; replaying a leftover journal is harmless
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def get(self, vector_id: str) -> Optional[str]:
+        return self._hashes.get(vector_id)
+
+    def is_current(self, vector_id: str, text_hash: str) -> bool:
+        return self._hashes.get(vector_id) == text_hash
+
+    def mark(self, entries: Iterable[Tuple[str, str]]) -> None:
+        entries = dict(entries)
+        if not entries:
+            return
+        with self._lock:
+            self._hashes.update(entries)
+            if os.path.dirname(self.journal_path):
+                os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entries) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
@@ -1,76 +1,56 @@
 from dotenv import load_dotenv
 import os
 import pandas as pd
-import snowflake.connector
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
+from typing import Any, Dict, Optional, TypedDict
 
 
-from langchain.chat_models import ChatOpenAI
-from langchain.agents import initialize_agent, AgentType
-from langchain.tools import tool
+from langchain_core.tools import tool
+
+from financials_db import get_repository
+from resources import get_graph, get_or_create
+from financials_snapshot import get_quarter_financials
+from charts import render_metric_chart
+from query_router import ROUTER_DECISIONS, classify, needs_planner
+from rag_agent import get_rag_graph
+from web_tools import tavily_search
 
 # Load credentials
 load_dotenv()
 
-# ✅ Query helper
-def query_snowflake(query: str) -> pd.DataFrame:
-    conn = snowflake.connector.connect(
-        user=os.getenv("SNOWFLAKE_USER"),
-        password=os.getenv("SNOWFLAKE_PASSWORD"),
-        account=os.getenv("SNOWFLAKE_ACCOUNT"),
-        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
-        database=os.getenv("SNOWFLAKE_DATABASE"),
-        schema=os.getenv("SNOWFLAKE_SCHEMA")
-    )
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+# ✅ Query helper (pooled connections, bind parameters)
+def query_snowflake(query: str, params: Optional[Any] = None) -> pd.DataFrame:
+    return get_repository().query(query, params)
 
 # ✅ Enhanced dynamic chart generator
 def generate_chart(df, metric="MARKETCAP") -> str:
-    df = df.sort_values("ASOFDATE")
-    df["ASOFDATE"] = pd.to_datetime(df["ASOFDATE"])
-
-    # Build the figure
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.plot(df["ASOFDATE"], df[metric], marker="o", linewidth=2, color="#007acc")
-
-    # Title and axes
-    ax.set_title(f"NVIDIA {metric} Over Time", fontsize=14)
-    ax.set_xlabel("Date", fontsize=12)
-    ax.set_ylabel(metric, fontsize=12)
-    plt.xticks(rotation=45)
-    ax.grid(True, linestyle="--", alpha=0.6)
-
-    # Format y-axis with billion/trillion scaling
-    def billions(x, pos):
-        if x >= 1e12:
-            return f"${x*1.0/1e12:.1f}T"
-        elif x >= 1e9:
-            return f"${x*1.0/1e9:.1f}B"
-        else:
-            return f"${x:,.0f}"
-    ax.yaxis.set_major_formatter(ticker.FuncFormatter(billions))
-
-    # Add data labels
-    for i, row in df.iterrows():
-        ax.annotate(
-            f'{row[metric]/1e9:.1f}B',
-            (row["ASOFDATE"], row[metric]),
-            textcoords="offset points",
-            xytext=(0, 8),
-            ha='center',
-            fontsize=8,
-            color='gray'
-        )
+    # Rendered off-thread and cached by content hash; no shared files on disk
+    key, png = render_metric_chart(df, metric=metric, detailed=True)
+    return f"📊 Chart rendered ({len(png):,} bytes, id {key[:12]})"
+
+def financials_summary(year: int, quarter: int) -> str:
+    df = get_quarter_financials(year, quarter)
+
+    if df.empty:
+        return f"No data found for year {year} and quarter {quarter}."
+
+    # Textual summary
+    row = df.iloc[0]
+    summary = (
+        f"NVIDIA Financials for Q{quarter} {year}:\n"
+        f"- ASOFDATE: {row['ASOFDATE']}\n"
+        f"- ENTERPRISEVALUE: {row['ENTERPRISEVALUE']:,}\n"
+        f"- MARKETCAP: {row['MARKETCAP']:,}\n"
+        f"- PERATIO: {row['PERATIO']:.2f}\n"
+        f"- PBRATIO: {row['PBRATIO']:.2f}\n"
+        f"- PSRATIO: {row['PSRATIO']:.2f}\n"
+        f"- PEGRATIO: {row['PEGRATIO']:.4f}\n"
+        f"- FORWARDPERATIO: {row['FORWARDPERATIO']:.2f}"
+    )
+
+    # Save enhanced chart
+    chart_msg = generate_chart(df, metric="MARKETCAP")
 
-    # Save the chart
-    plt.tight_layout()
-    chart_path = f"{metric.lower()}_chart.png"
-    plt.savefig(chart_path)
-    plt.close()
-    return f"📊 Chart saved as {chart_path}"
+    return summary + f"\n\n{chart_msg}"
 
 # ✅ LangChain Tool
 @tool
@@ -80,53 +60,92 @@ def get_nvidia_financials(input: str) -> str:
     Input: "year=2024, quarter=1"
     """
     try:
-        year = input.split("year=")[1].split(",")[0].strip()
-        quarter = input.split("quarter=")[1].strip()
-
-        query = f"""
-        SELECT * FROM NVIDIA_FINANCIALS 
-        WHERE YEAR(ASOFDATE) = {year} AND QUARTER(ASOFDATE) = {quarter}
-        """
-
-        df = query_snowflake(query)
-
-        if df.empty:
-            return f"No data found for year {year} and quarter {quarter}."
-
-        # Textual summary
-        row = df.iloc[0]
-        summary = (
-            f"NVIDIA Financials for Q{quarter} {year}:\n"
-            f"- ASOFDATE: {row['ASOFDATE']}\n"
-            f"- ENTERPRISEVALUE: {row['ENTERPRISEVALUE']:,}\n"
-            f"- MARKETCAP: {row['MARKETCAP']:,}\n"
-            f"- PERATIO: {row['PERATIO']:.2f}\n"
-            f"- PBRATIO: {row['PBRATIO']:.2f}\n"
-            f"- PSRATIO: {row['PSRATIO']:.2f}\n"
-            f"- PEGRATIO: {row['PEGRATIO']:.4f}\n"
-            f"- FORWARDPERATIO: {row['FORWARDPERATIO']:.2f}"
-        )
-
-        # Save enhanced chart
-        chart_msg = generate_chart(df, metric="MARKETCAP")
-
-        return summary + f"\n\n{chart_msg}"
+        year = int(input.split("year=")[1].split(",")[0].strip())
+        quarter = int(input.split("quarter=")[1].strip())
+        return financials_summary(year, quarter)
 
     except Exception as e:
         return f"Error parsing input or querying Snowflake: {e}"
 
-# 🔮 Language Model
-llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-
-# 🤖 Agent
-agent = initialize_agent(
-    tools=[get_nvidia_financials],
-    llm=llm,
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True
-)
+# 🤖 Agent (built on first use; the API never needs it, so importing this module stays cheap)
+def get_agent():
+    def create():
+        from langchain.chat_models import ChatOpenAI
+        from langchain.agents import initialize_agent, AgentType
+        # 🔮 Language Model
+        llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+        return initialize_agent(
+            tools=[get_nvidia_financials],
+            llm=llm,
+            agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+            verbose=True
+        )
+    return get_or_create("financials_react_agent", create)
+
+# 🧭 Router graph: period and intent are worked out locally, the ReAct planner only
+# runs when the router isn't confident (or a financials question names no quarter)
+class ResearchState(TypedDict, total=False):
+    question: str
+    top_k: int
+    year: Optional[int]
+    quarter: Optional[int]
+    route: Dict[str, Any]
+    output: str
+
+def route_question(state: ResearchState) -> Dict[str, Any]:
+    route = classify(state["question"], state.get("year"), state.get("quarter"))
+    route["method"] = "planner" if needs_planner(route) else "direct"
+    ROUTER_DECISIONS.inc(intent=route["intent"], method=route["method"])
+    return {"route": route, "year": route["year"], "quarter": route["quarter"]}
+
+def choose_tool(state: ResearchState) -> str:
+    route = state["route"]
+    return "planner" if route["method"] == "planner" else route["intent"]
+
+def financials_node(state: ResearchState) -> Dict[str, Any]:
+    try:
+        return {"output": financials_summary(state["year"], state["quarter"])}
+    except Exception as e:
+        return {"output": f"Error querying Snowflake: {e}"}
+
+def rag_node(state: ResearchState) -> Dict[str, Any]:
+    rag_state = {"question": state["question"], "top_k": state.get("top_k", 500)}
+    if state.get("year") is not None:
+        rag_state["year"] = state["year"]
+    if state.get("quarter") is not None:
+        rag_state["quarter"] = state["quarter"]
+    return {"output": get_rag_graph().invoke(rag_state).get("rag_output", "No RAG output returned.")}
+
+def web_node(state: ResearchState) -> Dict[str, Any]:
+    results = tavily_search(state["question"])
+    if not results:
+        return {"output": "No web insights available."}
+    return {"output": "\n".join(f"- {r.get('title', '')}: {r.get('url', '')}" for r in results)}
+
+def planner_node(state: ResearchState) -> Dict[str, Any]:
+    return {"output": get_agent().invoke(state["question"])["output"]}
+
+def build_router_graph():
+    from langgraph.graph import StateGraph, END
+    from langchain_core.runnables import RunnableLambda
+
+    builder = StateGraph(ResearchState)
+    builder.add_node("Router", RunnableLambda(route_question))
+    builder.add_node("Financials", RunnableLambda(financials_node))
+    builder.add_node("RAG", RunnableLambda(rag_node))
+    builder.add_node("Web", RunnableLambda(web_node))
+    builder.add_node("Planner", RunnableLambda(planner_node))
+    builder.set_entry_point("Router")
+    builder.add_conditional_edges("Router", choose_tool, {
+        "financial": "Financials", "rag": "RAG", "web": "Web", "planner": "Planner"})
+    for node in ("Financials", "RAG", "Web", "Planner"):
+        builder.add_edge(node, END)
+    return builder.compile()
+
+def get_router_graph():
+    return get_graph("research_router", build_router_graph)
 
 # 🔁 Prompt user from terminal
 #user_prompt = input("Your question: ")
-#response = agent.invoke(user_prompt)
+#response = get_router_graph().invoke({"question": user_prompt})
 #print(response["output"])
@@ -1,21 +1,14 @@
 # backend/llm_chat.py
 
-import os
+from functools import lru_cache
+from typing import Iterator
 import tiktoken
-import litellm
 from dotenv import load_dotenv
-import google.generativeai as genai
-from openai import OpenAI
-import anthropic
 
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
+from llm_providers import get_provider
+from telemetry import record_llm_usage, span
 
-litellm.api_key = OPENAI_API_KEY
-deepseek_client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
+load_dotenv()
 
 MODEL_PRICES = {
     "gpt-4o": 0.15 / 1_000_000,
@@ -24,16 +17,29 @@ MODEL_PRICES = {
     "claude-3.5 haiku": 0.80 / 1_000_000
 }
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    # Building a tiktoken encoding is expensive; do it once per model
+    try:
+        if "deepseek" in model:
+            return tiktoken.get_encoding("cl100k_base")
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # e.g. the encoding file can't be downloaded offline; cached so it isn't retried per call
+        print(f"Tokenizer unavailable for {model}, estimating from word count: {e}")
+        return None
+
 def count_tokens(text: str, model: str) -> int:
     try:
-        if "gemini" in model.lower() or "claude" in model.lower():
+        model = model.lower()
+        encoding = None if "gemini" in model or "claude" in model else get_encoding(model)
+        if encoding is None:
+            # No local tokenizer for these providers; word count is the estimate
             return len(text.split())
-        elif "deepseek" in model.lower():
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
-        else:
-            encoding = tiktoken.encoding_for_model(model)
-            return len(encoding.encode(text))
+        return len(encoding.encode(text, disallowed_special=()))
     except Exception as e:
         print(f"Token count error: {e}")
         return 0
@@ -51,60 +57,44 @@ User Question:
 Answer the question based solely on the document above.
 """
 
+def _usage(prompt_text: str, model_key: str) -> dict:
+    token_count = count_tokens(prompt_text, model=model_key)
+    cost_per_token = MODEL_PRICES.get(model_key, 0)
+    record_llm_usage(model_key, token_count, token_count * cost_per_token)
+    return {"tokens": token_count, "cost": token_count * cost_per_token}
+
 def get_llm_response(pdf_data: dict, question: str, llm_choice: str) -> dict:
     prompt_text = build_prompt(pdf_data, question)
     model_key = llm_choice.lower()
-    token_count = count_tokens(prompt_text, model=model_key)
-    cost_per_token = MODEL_PRICES.get(model_key, 0)
-    estimated_cost = token_count * cost_per_token
+    usage = _usage(prompt_text, model_key)
 
     try:
-        if model_key == "gpt-4o":
-            response = litellm.completion(
-                model="gpt-4o-mini-2024-07-18",
-                messages=[{"role": "user", "content": prompt_text}]
-            )
-            answer = response["choices"][0]["message"]["content"]
-
-        elif model_key == "gemini flash free":
-            genai.configure(api_key=GOOGLE_API_KEY)
-            model_gemini = genai.GenerativeModel('gemini-1.5-pro-latest')
-            response = model_gemini.generate_content(prompt_text)
-            answer = response.text
-
-        elif model_key in ["deepseek", "deepseek chat"]:
-            response = deepseek_client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant"},
-                    {"role": "user", "content": prompt_text},
-                ],
-                stream=False
-            )
-            answer = response.choices[0].message.content
-
-        elif model_key in ["claude", "claude-3", "claude-3.5 haiku"]:
-            client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
-            response = client.messages.create(
-                model="claude-3-5-haiku-20241022",
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt_text}]
-            )
-            answer = response.content[0].text if isinstance(response.content, list) else response.content
-
-        else:
-            answer = "LLM choice not recognized."
-
-        return {
-            "answer": answer,
-            "tokens": token_count,
-            "cost": estimated_cost
-        }
+        # Long-lived provider clients: no per-request client construction or TLS setup
+        provider = get_provider(model_key)
+        with span("llm", model=model_key, tokens=usage["tokens"]):
+            answer = provider.complete(prompt_text) if provider else "LLM choice not recognized."
+        return {"answer": answer, **usage}
 
     except Exception as e:
         print(f"Error processing LLM request: {e}")
-        return {
-            "answer": f"Error: {e}",
-            "tokens": token_count,
-            "cost": estimated_cost
-        }
+        return {"answer": f"Error: {e}", **usage}
+
+def stream_llm_response(pdf_data: dict, question: str, llm_choice: str) -> Iterator[str]:
+    """Yield the answer in pieces as the provider streams it back."""
+    prompt_text = build_prompt(pdf_data, question)
+    model_key = llm_choice.lower()
+    usage = _usage(prompt_text, model_key)
+
+    try:
+        provider = get_provider(model_key)
+        if provider is None:
+            yield "LLM choice not recognized."
+            return
+        # Covers the whole stream, first token to last
+        with span("llm", model=model_key, tokens=usage["tokens"], stream=True):
+            for token in provider.stream(prompt_text):
+                yield token
+
+    except Exception as e:
+        print(f"Error processing LLM stream: {e}")
+        yield f"Error: {e}"
@@ -0,0 +1,250 @@
+# backend/llm_hedging.py
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from llm_chat import MODEL_PRICES, build_prompt, count_tokens
+from llm_providers import DeadlineExceeded, canonical_model_key, get_provider, provider_available, time_left
+from telemetry import counter, gauge, histogram, record_llm_usage, span
+
+# LLM_HEDGING=0 sends every request to the primary provider only
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() in ("1", "true", "yes")
+# Ordered candidates for the second request; unavailable ones (no API key) are skipped
+LLM_HEDGE_BACKUPS = [m.strip() for m in os.getenv(
+    "LLM_HEDGE_BACKUPS", "deepseek,gemini flash free,claude-3.5 haiku").split(",") if m.strip()]
+# Hedge once the primary has been running longer than this percentile of its recent latencies
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Delay used until a provider has LLM_HEDGE_MIN_SAMPLES observations
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Seconds of expected latency one dollar per million tokens is worth when ranking backups;
+# raise it to favour cheap backups, lower it to favour fast ones
+LLM_HEDGE_COST_WEIGHT = float(os.getenv("LLM_HEDGE_COST_WEIGHT", "5"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "500"))
+
+LLM_REQUEST_LATENCY = histogram("nvidia_llm_request_duration_seconds",
+                                "Provider call latency by model and outcome (ok, error, cancelled).",
+                                ("model", "outcome"))
+LLM_HEDGES = counter("nvidia_llm_hedges_total", "Hedged LLM requests by primary, backup and winner.",
+                     ("primary", "backup", "winner"))
+
+
+class LatencyHistogram:
+    """
+    Sliding window of recent call latencies and outcomes for one provider.
+    Calls cancelled before finishing only tell us the latency was at least
+    that long, so they are kept apart as lower bounds and can raise an
+    estimate but never lower it.
+    """
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._censored: Deque[float] = deque(maxlen=window)
+        self._errors: Deque[bool] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, ok: bool = True, cancelled: bool = False) -> None:
+        with self._lock:
+            if cancelled:
+                self._censored.append(seconds)
+                return
+            if ok:
+                self._samples.append(seconds)
+            self._errors.append(not ok)
+
+    def count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            completed = np.fromiter(self._samples, dtype=np.float64)
+            estimate = float(np.percentile(completed, q))
+            # A call cancelled after running longer than the estimate would have been slower still
+            slower = [c for c in self._censored if c > estimate]
+            if slower:
+                estimate = float(np.percentile(np.concatenate([completed, slower]), q))
+            return estimate
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return sum(self._errors) / len(self._errors) if self._errors else 0.0
+
+    def snapshot(self) -> dict:
+        return {"count": self.count(), "cancelled": len(self._censored), "p50": self.percentile(50), "p95": self.percentile(95),
+                "p99": self.percentile(99), "error_rate": round(self.error_rate(), 3)}
+
+
+_histograms: Dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+
+def latency_histogram(model_key: str) -> LatencyHistogram:
+    model_key = canonical_model_key(model_key)
+    with _histograms_lock:
+        if model_key not in _histograms:
+            _histograms[model_key] = LatencyHistogram()
+        return _histograms[model_key]
+
+def latency_stats() -> Dict[str, dict]:
+    return {key: hist.snapshot() for key, hist in list(_histograms.items())}
+
+# The window hedge_delay and backup_score decide from, as exported at /metrics
+gauge("nvidia_llm_hedge_window", "Recent LLM calls per model: count, cancelled, p50/p95/p99 seconds, error_rate.",
+      ("model", "stat"),
+      lambda: [({"model": model, "stat": stat}, value)
+               for model, snapshot in latency_stats().items() for stat, value in snapshot.items()])
+
+
+def hedge_delay(primary: str) -> float:
+    hist = latency_histogram(primary)
+    if hist.count() < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return max(LLM_HEDGE_MIN_DELAY, hist.percentile(LLM_HEDGE_PERCENTILE))
+
+def backup_score(model_key: str) -> float:
+    # Expected latency plus the price of the duplicate request, in seconds
+    hist = latency_histogram(model_key)
+    expected = hist.percentile(50) if hist.count() >= LLM_HEDGE_MIN_SAMPLES else LLM_HEDGE_DEFAULT_DELAY
+    expected *= 1.0 + hist.error_rate()
+    return expected + LLM_HEDGE_COST_WEIGHT * MODEL_PRICES.get(model_key, 0) * 1_000_000
+
+def choose_backup(primary: str, candidates: Optional[List[str]] = None) -> Optional[str]:
+    primary = canonical_model_key(primary)
+    pool = [canonical_model_key(m) for m in (candidates if candidates is not None else LLM_HEDGE_BACKUPS)]
+    pool = [m for m in dict.fromkeys(pool) if m != primary and provider_available(m)]
+    if not pool:
+        return None
+    return min(pool, key=backup_score)
+
+
+# One event loop owns the async SDK clients; their connection pools are bound to it
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _hedge_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-hedging", daemon=True).start()
+        return _loop
+
+async def _timed(model_key: str, prompt: str) -> str:
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        return await get_provider(model_key).acomplete(prompt)
+    except asyncio.CancelledError:
+        # A cancelled loser ran at least this long; recorded as a lower bound, not a completion
+        outcome = "cancelled"
+        raise
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        latency_histogram(model_key).observe(elapsed, ok=outcome != "error", cancelled=outcome == "cancelled")
+        LLM_REQUEST_LATENCY.observe(elapsed, model=model_key, outcome=outcome)
+
+async def _race(prompt: str, primary: str, backup: Optional[str],
+                launched: List[str]) -> Tuple[str, str, List[str]]:
+    """
+    Returns (answer, winning model, every model that was sent the prompt).
+    `launched` is filled in as requests go out, so it is also accurate when the race fails or is cancelled.
+    """
+    tasks = {asyncio.ensure_future(_timed(primary, prompt)): primary}
+    launched.append(primary)
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay(primary) if backup else None)
+        first = next(iter(done), None)
+        if first is not None and not first.exception():
+            return first.result(), primary, launched
+        if backup is None:
+            return await first, primary, launched
+
+        # Primary is slow or already failed: send the same prompt to the backup
+        print(f"Hedging LLM request: {primary} -> {backup}")
+        tasks[asyncio.ensure_future(_timed(backup, prompt))] = backup
+        launched.append(backup)
+        pending = {t for t in tasks if not t.done()}
+        error: Optional[BaseException] = first.exception() if first is not None else None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.exception():
+                    return task.result(), tasks[task], launched
+                error = task.exception()
+        raise error
+    finally:
+        # Cancelling the loser closes its HTTP request
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+def _usage(prompt_text: str, models: List[str]) -> dict:
+    # Every provider that was sent the prompt is billed for it
+    tokens = {m: count_tokens(prompt_text, model=m) for m in models}
+    for m, n in tokens.items():
+        record_llm_usage(m, n, n * MODEL_PRICES.get(m, 0))
+    return {"tokens": tokens[models[0]], "cost": sum(n * MODEL_PRICES.get(m, 0) for m, n in tokens.items())}
+
+async def aget_hedged_llm_response(pdf_data: dict, question: str, llm_choice: str,
+                                   backups: Optional[List[str]] = None, timeout: Optional[float] = None) -> dict:
+    """`timeout` bounds the whole race; by default it is what the caller's deadline leaves."""
+    prompt_text = build_prompt(pdf_data, question)
+    primary = canonical_model_key(llm_choice)
+    if get_provider(primary) is None:
+        return {"answer": "LLM choice not recognized.", "tokens": 0, "cost": 0, "model": primary}
+    try:
+        if timeout is None:
+            timeout = time_left(None)
+    except DeadlineExceeded as e:
+        return {"answer": f"Error: {e}", "tokens": 0, "cost": 0, "model": primary}
+    backup = choose_backup(primary, backups) if LLM_HEDGING else None
+
+    # wait_for cancels both requests at the deadline, which closes their HTTP connections
+    launched: List[str] = []
+    race = asyncio.wait_for(_race(prompt_text, primary, backup, launched), timeout)
+    future = asyncio.run_coroutine_threadsafe(race, _hedge_loop())
+    try:
+        answer, model, launched = await asyncio.wrap_future(future)
+        if len(launched) > 1:
+            LLM_HEDGES.inc(primary=primary, backup=backup, winner=model)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            e = DeadlineExceeded(f"no answer within {timeout:.1f}s")
+        print(f"Error processing LLM request: {e}")
+        # Only the models that were actually sent the prompt are billed
+        usage = _usage(prompt_text, list(launched)) if launched else {"tokens": 0, "cost": 0}
+        return {"answer": f"Error: {e}", **usage, "model": primary}
+    return {"answer": answer, **_usage(prompt_text, launched), "model": model, "hedged": len(launched) > 1}
+
+def get_hedged_llm_response(pdf_data: dict, question: str, llm_choice: str,
+                            backups: Optional[List[str]] = None) -> dict:
+    """
+    Like get_llm_response, but if `llm_choice` hasn't answered within its recent
+    LLM_HEDGE_PERCENTILE latency the same prompt also goes to the best backup
+    (latency and MODEL_PRICES weighted); the first answer wins, the other is cancelled.
+    """
+    with span("llm", model=canonical_model_key(llm_choice)) as attributes:
+        try:
+            # Tasks on the hedge loop don't see this thread's deadline, so it is passed along
+            timeout = time_left(None)
+        except DeadlineExceeded as e:
+            return {"answer": f"Error: {e}", "tokens": 0, "cost": 0, "model": canonical_model_key(llm_choice)}
+        coro = aget_hedged_llm_response(pdf_data, question, llm_choice, backups, timeout)
+        # Bounded: the race inside is cancelled once `timeout` runs out
+        response = asyncio.run_coroutine_threadsafe(coro, _hedge_loop()).result()
+        attributes.update(winner=response.get("model"), hedged=response.get("hedged", False),
+                          tokens=response["tokens"])
+        return response
@@ -0,0 +1,288 @@
+# backend/llm_providers.py
+import asyncio
+import contextvars
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from resources import get_or_create
+
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+
+SYSTEM_PROMPT = "You are a helpful assistant"
+
+
+class DeadlineExceeded(TimeoutError):
+    """The caller's deadline passed before the call could finish."""
+
+
+# time.monotonic() by which LLM work for the current request must be done (None: no deadline)
+_deadline: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar("llm_deadline", default=None)
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Bound the work done inside the block: LLM calls (retries and backoff
+    included), web searches, vector queries and chart renders check it.
+    """
+    if seconds is None:
+        yield
+        return
+    until = time.monotonic() + seconds
+    current = _deadline.get()
+    # A nested deadline can only tighten the outer one
+    token = _deadline.set(until if current is None else min(current, until))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def time_left(default: Optional[float] = LLM_TIMEOUT) -> Optional[float]:
+    """Seconds a call may take now: `default`, capped by the current deadline."""
+    until = _deadline.get()
+    if until is None:
+        return default
+    left = until - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("deadline exceeded before the LLM call")
+    return left if default is None else min(default, left)
+
+def _backoff(attempt: int) -> float:
+    # Exponential backoff with jitter so retries from concurrent requests spread out
+    return LLM_RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random())
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    delay = _backoff(attempt)
+    left = time_left(None)
+    if left is not None and delay >= left:
+        # No time left for another attempt; surface the real failure
+        raise error
+    return delay
+
+def with_retries(call: Callable[[float], Any], retries: int = LLM_MAX_RETRIES) -> Any:
+    """`call` gets the per-request timeout to use: LLM_TIMEOUT or whatever the deadline leaves."""
+    for attempt in range(retries + 1):
+        try:
+            return call(time_left())
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = _retry_delay(attempt, e)
+            print(f"LLM call failed (attempt {attempt + 1}), retrying: {e}")
+            time.sleep(delay)
+
+async def awith_retries(call: Callable[[float], Awaitable[Any]], retries: int = LLM_MAX_RETRIES) -> Any:
+    for attempt in range(retries + 1):
+        try:
+            return await call(time_left())
+        except (asyncio.CancelledError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = _retry_delay(attempt, e)
+            print(f"LLM call failed (attempt {attempt + 1}), retrying: {e}")
+            await asyncio.sleep(delay)
+
+
+class LLMProvider:
+    """
+    One long-lived client per provider. SDK clients keep their HTTP
+    connection pools between requests; SDK-level retries are disabled in
+    favour of with_retries/awith_retries so every provider backs off the same way.
+    """
+
+    name = "base"
+
+    def complete(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def acomplete(self, prompt: str) -> str:
+        # Providers without a native async client run the blocking call in a thread
+        return await asyncio.to_thread(self.complete, prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield self.complete(prompt)
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    def __init__(self, name: str, model: str, api_key: Optional[str], base_url: Optional[str] = None,
+                 system_prompt: Optional[str] = None):
+        from openai import AsyncOpenAI, OpenAI
+        self.name = name
+        self.model = model
+        self.system_prompt = system_prompt
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=LLM_TIMEOUT, max_retries=0)
+        self.async_client = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=LLM_TIMEOUT, max_retries=0)
+
+    def _messages(self, prompt: str) -> list:
+        messages = [{"role": "user", "content": prompt}]
+        if self.system_prompt:
+            messages.insert(0, {"role": "system", "content": self.system_prompt})
+        return messages
+
+    def complete(self, prompt: str) -> str:
+        response = with_retries(lambda timeout: self.client.chat.completions.create(
+            model=self.model, messages=self._messages(prompt), timeout=timeout))
+        return response.choices[0].message.content
+
+    async def acomplete(self, prompt: str) -> str:
+        response = await awith_retries(lambda timeout: self.async_client.chat.completions.create(
+            model=self.model, messages=self._messages(prompt), timeout=timeout))
+        return response.choices[0].message.content
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        response = with_retries(lambda timeout: self.client.chat.completions.create(
+            model=self.model, messages=self._messages(prompt), stream=True, timeout=timeout))
+        for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model: str = "gemini-1.5-pro-latest"):
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_API_KEY)
+        self.model = genai.GenerativeModel(model)
+
+    def complete(self, prompt: str) -> str:
+        return with_retries(lambda timeout: self.model.generate_content(
+            prompt, request_options={"timeout": timeout})).text
+
+    async def acomplete(self, prompt: str) -> str:
+        response = await awith_retries(lambda timeout: self.model.generate_content_async(
+            prompt, request_options={"timeout": timeout}))
+        return response.text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        response = with_retries(lambda timeout: self.model.generate_content(
+            prompt, stream=True, request_options={"timeout": timeout}))
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class AnthropicProvider(LLMProvider):
+    name = "claude"
+
+    def __init__(self, model: str = "claude-3-5-haiku-20241022", max_tokens: int = 1024):
+        import anthropic
+        self.model = model
+        self.max_tokens = max_tokens
+        self.client = anthropic.Anthropic(api_key=CLAUDE_API_KEY, timeout=LLM_TIMEOUT, max_retries=0)
+        self.async_client = anthropic.AsyncAnthropic(api_key=CLAUDE_API_KEY, timeout=LLM_TIMEOUT, max_retries=0)
+
+    @staticmethod
+    def _text(response) -> str:
+        return response.content[0].text if isinstance(response.content, list) else response.content
+
+    def complete(self, prompt: str) -> str:
+        return self._text(with_retries(lambda timeout: self.client.messages.create(
+            model=self.model, max_tokens=self.max_tokens, messages=[{"role": "user", "content": prompt}],
+            timeout=timeout)))
+
+    async def acomplete(self, prompt: str) -> str:
+        return self._text(await awith_retries(lambda timeout: self.async_client.messages.create(
+            model=self.model, max_tokens=self.max_tokens, messages=[{"role": "user", "content": prompt}],
+            timeout=timeout)))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        with self.client.messages.stream(model=self.model, max_tokens=self.max_tokens,
+                                         messages=[{"role": "user", "content": prompt}],
+                                         timeout=time_left()) as stream:
+            for text in stream.text_stream:
+                yield text
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic local stand-in with configurable latency, for tests and benchmarks."""
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = FAKE_LLM_LATENCY_MS):
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+
+    def _answer(self, prompt: str) -> str:
+        question = prompt.split("User Question:")[-1].split("Answer the question")[0].strip()
+        return f"Stub answer to '{question[:200]}' from {len(prompt)} prompt characters."
+
+    def complete(self, prompt: str) -> str:
+        self.calls += 1
+        # Behaves like a client-side request timeout when the deadline is shorter than the latency
+        timeout = time_left()
+        time.sleep(min(self.latency, timeout))
+        if self.latency > timeout:
+            raise DeadlineExceeded(f"fake provider timed out after {timeout:.2f}s")
+        return self._answer(prompt)
+
+    async def acomplete(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        words = self.complete(prompt).split(" ")
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+
+
+# model key (as accepted by get_llm_response) -> provider factory
+PROVIDER_FACTORIES: Dict[str, Callable[[], LLMProvider]] = {
+    "gpt-4o": lambda: OpenAICompatibleProvider("gpt-4o", "gpt-4o-mini-2024-07-18", OPENAI_API_KEY),
+    "gemini flash free": lambda: GeminiProvider(),
+    "deepseek": lambda: OpenAICompatibleProvider("deepseek", "deepseek-chat", DEEPSEEK_API_KEY,
+                                                 base_url="https://api.deepseek.com", system_prompt=SYSTEM_PROMPT),
+    "claude-3.5 haiku": lambda: AnthropicProvider(),
+    "fake": lambda: FakeProvider(),
+}
+
+# Aliases share one client with their canonical key
+MODEL_ALIASES = {
+    "deepseek chat": "deepseek",
+    "claude": "claude-3.5 haiku",
+    "claude-3": "claude-3.5 haiku",
+}
+
+# Providers that need an API key; the rest (fake) are always usable
+PROVIDER_CREDENTIALS = {
+    "gpt-4o": OPENAI_API_KEY,
+    "gemini flash free": GOOGLE_API_KEY,
+    "deepseek": DEEPSEEK_API_KEY,
+    "claude-3.5 haiku": CLAUDE_API_KEY,
+}
+
+def canonical_model_key(llm_choice: str) -> str:
+    model_key = llm_choice.lower()
+    return MODEL_ALIASES.get(model_key, model_key)
+
+def get_provider(llm_choice: str) -> Optional[LLMProvider]:
+    model_key = canonical_model_key(llm_choice)
+    factory = PROVIDER_FACTORIES.get(model_key)
+    if factory is None:
+        return None
+    return get_or_create(("llm_provider", model_key), factory)
+
+def provider_available(llm_choice: str) -> bool:
+    model_key = canonical_model_key(llm_choice)
+    if model_key not in PROVIDER_FACTORIES:
+        return False
+    return model_key not in PROVIDER_CREDENTIALS or bool(PROVIDER_CREDENTIALS[model_key])
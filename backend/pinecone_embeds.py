@@ -1,59 +1,302 @@
 # backend/pinecone_embeds.py
 import os
+import re
+import threading
 import time
-from pinecone import Pinecone
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from resources import TTLCache, get_index, get_or_create
+from vector_store import VECTOR_BACKEND, LOCAL_INDEX_DIR, LocalVectorStore
+from embedding_service import EmbeddingService, HashingEmbedder
+from ingest_manifest import INGEST_MANIFEST_PATH, IngestManifest, chunk_hash
+from document_store import DOCUMENT_STORE_PATH, DocumentStore
+from llm_chat import count_tokens
+from llm_providers import time_left
+from telemetry import gauge, in_context, span
+
 load_dotenv()
 api_key = os.getenv("PINECONE_API_KEY")
 region = os.getenv("PINECONE_REGION", "us-east-1")
-pc = Pinecone(api_key=api_key)
 
 INDEX_NAME = "bigdata5"  # single index for all PDFs
-model = SentenceTransformer("all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# EMBEDDING_BACKEND=hash swaps the model for a deterministic offline stand-in
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+EMBED_QUANTIZE = os.getenv("EMBED_QUANTIZE", "none").lower()
+INDEX_STATS_TTL = float(os.getenv("INDEX_STATS_TTL", "300"))
 
-def upsert_embeddings(chunks: list, metadata: dict):
-    vectors = []
-    for i, chunk in enumerate(chunks):
-        embedding = model.encode(chunk).tolist()
-        vectors.append({
-            "id": f"{metadata.get('source')}-{i}",
-            "values": embedding,
-            "metadata": {**metadata, "chunk_index": i, "text": chunk}
-        })
-
-    index = pc.Index(INDEX_NAME)
-    
-    batch_size = 50
-    for i in range(0, len(vectors), batch_size):
-        batch = vectors[i:i + batch_size]
-        for attempt in range(3):
-            try:
-                index.upsert(vectors=batch)
-                print(f"Upserted batch {i // batch_size + 1}")
+# Ingestion tuning: chunks per encode call, vectors per upsert request, parallel upserts
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "256"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+
+# Token counts stored with each vector are measured with this model's tokenizer
+TOKEN_COUNT_MODEL = "gpt-4o"
+
+# Store each fiscal quarter in its own namespace ("2024-Q1") so filtered queries scan one partition
+PARTITION_BY_QUARTER = os.getenv("PARTITION_BY_QUARTER", "false").lower() in ("1", "true", "yes")
+
+# "..._2024_Q1.pdf", "FY2024-Q1", "Q1 2024", ...
+_PERIOD_PATTERNS = [
+    (re.compile(r"(20\d{2})\D{0,3}Q([1-4])", re.IGNORECASE), 1, 2),
+    (re.compile(r"Q([1-4])\D{0,4}(20\d{2})", re.IGNORECASE), 2, 1),
+]
+
+# Heavy clients are created on first use (or during warm-up), not at import time
+def get_pinecone_client():
+    def create():
+        from pinecone import Pinecone
+        return Pinecone(api_key=api_key)
+    return get_or_create("pinecone_client", create)
+
+def get_model():
+    if EMBEDDING_BACKEND == "hash":
+        return get_or_create("embedding_model_hash", HashingEmbedder)
+    def create():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return get_or_create("embedding_model", create)
+
+def get_query_model():
+    # EMBED_QUANTIZE=int8 serves queries from a dynamically quantized copy (faster on CPU,
+    # scores drift slightly from the float32 vectors in the index)
+    if EMBED_QUANTIZE != "int8" or EMBEDDING_BACKEND == "hash":
+        return get_model()
+    def create():
+        import copy
+        import torch
+        return torch.quantization.quantize_dynamic(copy.deepcopy(get_model()), {torch.nn.Linear}, dtype=torch.qint8)
+    return get_or_create("embedding_model_int8", create)
+
+# Query-time encodes from concurrent requests are micro-batched and cached
+embedding_service = EmbeddingService(get_query_model)
+gauge("nvidia_query_embeddings", "Query embedding batching: batches, texts encoded, cached vectors, mean batch size.",
+      ("stat",), lambda: [({"stat": stat}, value) for stat, value in embedding_service.stats().items()])
+
+def __getattr__(name: str):
+    # Keeps `from pinecone_embeds import pc, model` working for scripts
+    if name == "pc":
+        return get_pinecone_client()
+    if name == "model":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_index_handle():
+    # One shared index handle per process instead of pc.Index() on every call
+    if VECTOR_BACKEND == "local":
+        return get_or_create(("index", "local", LOCAL_INDEX_DIR), lambda: LocalVectorStore(LOCAL_INDEX_DIR))
+    return get_index(get_pinecone_client(), INDEX_NAME)
+
+def default_manifest_path() -> str:
+    # Each backend tracks its own indexed chunks
+    if VECTOR_BACKEND == "local":
+        return os.path.join(LOCAL_INDEX_DIR, "ingest_manifest.json")
+    return INGEST_MANIFEST_PATH
+
+def get_document_store() -> DocumentStore:
+    # Chunk text lives beside the index it belongs to, not in vector metadata
+    path = os.path.join(LOCAL_INDEX_DIR, "document_store.db") if VECTOR_BACKEND == "local" else DOCUMENT_STORE_PATH
+    return get_or_create(("document_store", path), lambda: DocumentStore(path))
+
+def fiscal_period(metadata: dict) -> Tuple[Optional[int], Optional[int]]:
+    """Fiscal (year, quarter) from explicit metadata, else parsed from the source name."""
+    year, quarter = metadata.get("year"), metadata.get("quarter")
+    if year is None or quarter is None:
+        source = str(metadata.get("source", ""))
+        for pattern, year_group, quarter_group in _PERIOD_PATTERNS:
+            found = pattern.search(source)
+            if found:
+                year = year if year is not None else found.group(year_group)
+                quarter = quarter if quarter is not None else found.group(quarter_group)
                 break
-            except Exception as e:
-                print(f"Error upserting batch {i // batch_size + 1}, attempt {attempt+1}: {e}")
+    return (int(year) if year is not None else None, int(quarter) if quarter is not None else None)
+
+def quarter_namespace(year: Optional[int], quarter: Optional[int]) -> str:
+    if PARTITION_BY_QUARTER and year is not None and quarter is not None:
+        return f"{year}-Q{quarter}"
+    return ""
+
+def period_filter(year: Optional[int], quarter: Optional[int]) -> Optional[dict]:
+    flt = {}
+    if year is not None:
+        flt["year"] = {"$eq": int(year)}
+    if quarter is not None:
+        flt["quarter"] = {"$eq": int(quarter)}
+    return flt or None
+
+def describe_index_stats() -> dict:
+    with span("describe_index_stats"):
+        return get_index_handle().describe_index_stats()
+
+# describe_index_stats() is a network round trip; serve it from a TTL cache
+index_stats = TTLCache(describe_index_stats, ttl=INDEX_STATS_TTL)
+
+# Callbacks run after upsert_embeddings changes the index (e.g. answer caches)
+_upsert_listeners = []
+
+def on_upsert(callback) -> None:
+    _upsert_listeners.append(callback)
+
+def _upsert_batch(index, batch: list, checkpoint, namespace: str = "", attempts: int = 3) -> int:
+    for attempt in range(attempts):
+        try:
+            index.upsert(vectors=batch, namespace=namespace)
+            # Checkpoint only after the write succeeded
+            checkpoint([(v["id"], v["metadata"]["text_hash"]) for v in batch])
+            return len(batch)
+        except Exception as e:
+            print(f"Error upserting batch starting at {batch[0]['id']}, attempt {attempt+1}: {e}")
+            if attempt < attempts - 1:
                 time.sleep(2 ** attempt)
-                if attempt == 2:
-                    print("Skipping batch.")
-    print(f"Upserted all {len(vectors)} vectors to index '{INDEX_NAME}'.")
+    return 0
+
+def upsert_embeddings(chunks: list, metadata: dict, manifest_path: Optional[str] = None) -> dict:
+    source = metadata.get("source")
+    manifest = IngestManifest(manifest_path or default_manifest_path())
+
+    # Structured fiscal period so queries can filter (and optionally partition) on it
+    year, quarter = fiscal_period(metadata)
+    metadata = dict(metadata)
+    if year is not None:
+        metadata["year"] = year
+    if quarter is not None:
+        metadata["quarter"] = quarter
+    namespace = quarter_namespace(year, quarter)
+
+    # Skip chunks already indexed with identical text (re-ingests and resumed runs)
+    pending = []
+    for i, chunk in enumerate(chunks):
+        vector_id, text_hash = f"{source}-{i}", chunk_hash(chunk)
+        if not manifest.is_current(vector_id, text_hash):
+            pending.append((i, vector_id, text_hash, chunk))
+    skipped = len(chunks) - len(pending)
+    if not pending:
+        print(f"All {len(chunks)} chunks of '{source}' are already indexed.")
+        return {"upserted": 0, "skipped": skipped, "failed": 0}
+
+    index = get_index_handle()
+    documents = get_document_store()
+    # Bound the number of encoded-but-unsent batches held in memory
+    in_flight = threading.BoundedSemaphore(UPSERT_CONCURRENCY * 2)
+    futures = []
+
+    def submit(pool, batch):
+        in_flight.acquire()
+        future = pool.submit(_upsert_batch, index, batch, checkpoint, namespace)
+        future.add_done_callback(lambda _: in_flight.release())
+        futures.append(future)
 
-def query_pinecone(query_text: str, top_k: int = 100) -> dict:
-    index = pc.Index(INDEX_NAME)
-    query_vector = model.encode(query_text).tolist()
+    # The local index writes its files once per call instead of once per batch, so its
+    # checkpoint entries are held back until those files are on disk
+    deferred_save = getattr(index, "deferred_save", None)
+    written: list = []
+    checkpoint = written.extend if deferred_save else manifest.mark
+    # Encode large batches on this thread while earlier batches upload concurrently
+    with (deferred_save or nullcontext)(), ThreadPoolExecutor(max_workers=UPSERT_CONCURRENCY, thread_name_prefix="upsert") as pool:
+        for start in range(0, len(pending), ENCODE_BATCH_SIZE):
+            group = pending[start:start + ENCODE_BATCH_SIZE]
+            embeddings = get_model().encode([chunk for _, _, _, chunk in group], batch_size=64, convert_to_numpy=True)
+            # Text goes to the document store before its vector becomes queryable
+            documents.put_many((vector_id, source, i, text_hash, chunk) for i, vector_id, text_hash, chunk in group)
+            vectors = [
+                {
+                    "id": vector_id,
+                    "values": embedding.tolist(),
+                    # Only small fields: the token count lets retrieval budget the context before fetching text
+                    "metadata": {**metadata, "chunk_index": i, "text_hash": text_hash,
+                                 "tokens": count_tokens(chunk, TOKEN_COUNT_MODEL)},
+                }
+                for (i, vector_id, text_hash, chunk), embedding in zip(group, embeddings)
+            ]
+            for b in range(0, len(vectors), UPSERT_BATCH_SIZE):
+                submit(pool, vectors[b:b + UPSERT_BATCH_SIZE])
+        upserted = sum(f.result() for f in futures)
+    if written:
+        manifest.mark(written)
+
+    failed = len(pending) - upserted
+    print(f"Upserted {upserted} vectors to index '{INDEX_NAME}' ({skipped} unchanged skipped).")
+    if failed:
+        print(f"{failed} vectors failed to upsert; rerun to resume from the checkpoint.")
+
+    if upserted:
+        # Record counts changed; refresh cached stats without blocking the caller
+        index_stats.refresh(background=True)
+        for callback in _upsert_listeners:
+            callback()
+    return {"upserted": upserted, "skipped": skipped, "failed": failed}
+
+def query_namespaces(year: Optional[int], quarter: Optional[int]) -> List[str]:
+    if not PARTITION_BY_QUARTER:
+        return [""]
+    if year is not None and quarter is not None:
+        return [quarter_namespace(year, quarter)]
+    # Partial filter: every quarter namespace that can match, plus unpartitioned vectors
+    names = list(index_stats.get().get("namespaces", {}) or [""])
+    if year is not None:
+        names = [ns for ns in names if ns == "" or ns.startswith(f"{year}-Q")]
+    if quarter is not None:
+        names = [ns for ns in names if ns == "" or ns.endswith(f"-Q{quarter}")]
+    return names or [""]
+
+def query_pinecone(query_text: str, top_k: int = 100, include_values: bool = False,
+                   year: Optional[int] = None, quarter: Optional[int] = None) -> dict:
+    index = get_index_handle()
+    with span("embed"):
+        query_vector = embedding_service.encode(query_text).tolist()
+    flt = period_filter(year, quarter)
+
+    def query_one(namespace: str) -> list:
+        # Raises once the agent's deadline has passed instead of queueing another round trip
+        time_left(None)
+        with span("vector_query", namespace=namespace, top_k=top_k):
+            response = index.query(
+                vector=query_vector,
+                top_k=top_k,
+                include_metadata=True,
+                include_values=include_values,
+                filter=flt,
+                namespace=namespace
+            )
+            return list(response.get("matches", []))
 
     try:
-        response = index.query(
-            vector=query_vector,
-            top_k=top_k,
-            include_metadata=True
-        )
-        return {"matches": response.get("matches", [])}
+        namespaces = query_namespaces(year, quarter)
+        if len(namespaces) == 1:
+            return {"matches": query_one(namespaces[0])}
+        with ThreadPoolExecutor(max_workers=min(len(namespaces), 8)) as pool:
+            # Wrapped before the hop, so each query carries this request's trace and deadline
+            calls = [in_context(query_one, ns) for ns in namespaces]
+            matches = [m for found in pool.map(lambda call: call(), calls) for m in found]
+        matches.sort(key=lambda m: m.get("score", 0.0), reverse=True)
+        return {"matches": matches[:top_k]}
     except Exception as e:
-        print(f"Error querying Pinecone index '{INDEX_NAME}': {e}")
+        print(f"Error querying {VECTOR_BACKEND} index '{INDEX_NAME}': {e}")
         return {"matches": []}
 
+def fetch_values(ids: List[str], year: Optional[int] = None, quarter: Optional[int] = None) -> Dict[str, list]:
+    """Vectors for `ids` (from the namespaces a query for this period searches), for near-duplicate checks."""
+    if not ids:
+        return {}
+    index = get_index_handle()
+    values: Dict[str, list] = {}
+    try:
+        with span("vector_fetch", ids=len(ids)):
+            for namespace in query_namespaces(year, quarter):
+                response = index.fetch(ids=ids, namespace=namespace)
+                vectors = response.get("vectors", {}) if isinstance(response, dict) else response.vectors
+                for vector_id, vector in vectors.items():
+                    values[vector_id] = vector["values"] if isinstance(vector, dict) else vector.values
+    except Exception as e:
+        print(f"Error fetching vectors from {VECTOR_BACKEND} index '{INDEX_NAME}': {e}")
+    return values
+
+def fetch_texts(ids: List[str]) -> Dict[str, str]:
+    with span("document_fetch", ids=len(ids)):
+        return get_document_store().get_many(ids)
+
 if __name__ == "__main__":
     pass
@@ -0,0 +1,162 @@
+# backend/query_router.py
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pinecone_embeds import embedding_service
+from resources import get_or_create
+from telemetry import counter, span
+
+# Below this confidence the question goes to the LLM planner instead of straight to a tool
+ROUTER_CONFIDENCE = float(os.getenv("ROUTER_CONFIDENCE", "0.7"))
+# Softmax temperature over the combined scores; lower makes the router more decisive
+ROUTER_TEMPERATURE = float(os.getenv("ROUTER_TEMPERATURE", "0.1"))
+# Score added per matching keyword rule, on the same scale as a cosine similarity
+ROUTER_RULE_WEIGHT = float(os.getenv("ROUTER_RULE_WEIGHT", "0.15"))
+
+ROUTER_DECISIONS = counter("nvidia_router_decisions_total", "Routed questions by intent and method (direct, planner).",
+                           ("intent", "method"))
+
+INTENTS = ("financial", "rag", "web")
+
+INTENT_RULES: Dict[str, List["re.Pattern"]] = {
+    # Valuation measures served from NVIDIA_FINANCIALS
+    "financial": [re.compile(p) for p in (
+        r"\bmarket ?cap(italization)?\b", r"\benterprise value\b", r"\bvaluation\b",
+        r"\b(forward )?p/?e( ratio)?\b", r"\bp/?b( ratio)?\b", r"\bp/?s( ratio)?\b", r"\bpeg\b",
+        r"\bprice[- ]to[- ](earnings|book|sales)\b", r"\bmultiples?\b",
+    )],
+    # What the filings say: segments, results, commentary, policies
+    "rag": [re.compile(p) for p in (
+        r"\b10-?[kq]\b", r"\bfilings?\b", r"\b(annual|quarterly) report\b", r"\bmd&a\b", r"\brisk factors?\b",
+        r"\bsegments?\b", r"\brevenue\b", r"\bgross margin\b", r"\boperating (income|expenses)\b",
+        r"\bguidance\b", r"\baccounting polic(y|ies)\b", r"\b(summar(y|ize)|explain|describe)\b",
+    )],
+    # Anything happening now
+    "web": [re.compile(p) for p in (
+        r"\b(latest|today|this week|right now|currently|recent(ly)?)\b", r"\bnews\b", r"\bannounce(d|ment|s)?\b",
+        r"\b(stock|share) price\b", r"\banalysts?\b", r"\brumou?rs?\b", r"\bcompetitors?\b",
+    )],
+}
+
+# A few phrasings per intent; questions are compared to these by embedding similarity
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "financial": [
+        "What was NVIDIA's market cap in Q2 2024?",
+        "Show NVIDIA's P/E ratio and enterprise value for the quarter",
+        "How were NVIDIA's valuation multiples in the fourth quarter of 2023?",
+        "NVIDIA price to book and price to sales ratio",
+    ],
+    "rag": [
+        "How did NVIDIA's data center revenue develop according to the 10-K?",
+        "What did NVIDIA report about gross margin drivers?",
+        "Summarize the risk factors in NVIDIA's annual report",
+        "Explain NVIDIA's accounting policies for revenue recognition",
+    ],
+    "web": [
+        "What is the latest news about NVIDIA?",
+        "How are analysts reacting to NVIDIA's announcement today?",
+        "What is NVIDIA's stock price right now?",
+        "What are NVIDIA's competitors doing in AI chips recently?",
+    ],
+}
+
+_QUARTER_WORDS = {"first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3, "fourth": 4, "4th": 4}
+_QUARTER_PATTERNS = [
+    re.compile(r"\bq([1-4])\b"),                                   # Q1, Q1 2024, Q1'24
+    re.compile(r"\b([1-4])q(?:\s*'?\d{2}(?:\d{2})?)?\b"),          # 1Q, 1Q24, 1Q 2024
+    re.compile(r"\b(first|1st|second|2nd|third|3rd|fourth|4th)\s+(?:fiscal\s+)?quarter\b"),
+]
+# A four-digit number is only read as a year next to period wording; "2000 engineers" is a count
+_YEAR = r"((?:19|20)\d{2})\b(?!\s+(?!(?:results|earnings|sales|was|has|is|as|its|vs|versus)\b)[a-z]+s\b)"
+_YEAR_PATTERNS = [
+    re.compile(r"\b(?:fy|fiscal(?:\s+year)?|year|q[1-4]|[1-4]q|quarter(?:\s+of)?(?:\s+fiscal)?|10-?[kq])\s*'?" + _YEAR),
+                                                                   # FY2024, fiscal year 2024, Q1 2024, 10-K 2024
+    re.compile(r"\b(?:in|for|of|during|since|from|to|through|until|by|ended|ending|vs\.?|versus|and)\s+" + _YEAR),
+                                                                   # revenue in 2024
+    re.compile(r"\b" + _YEAR + r"(?=\s*(?:[?.!,;:)]|$))"),        # NVIDIA revenue 2024?
+    re.compile(r"^\s*" + _YEAR),                                   # 2024 results
+    re.compile(r"\bfy\s*'?(\d{2})\b"),                             # FY24, FY'24
+    re.compile(r"\b(?:q[1-4]|[1-4]q)\s*'?(\d{2})\b"),              # Q1'24, 1Q24
+]
+
+
+def extract_period(question: str) -> Tuple[Optional[int], Optional[int]]:
+    """(year, quarter) named in the question, each None when absent."""
+    text = question.lower()
+    quarter = None
+    for pattern in _QUARTER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            value = match.group(1)
+            quarter = _QUARTER_WORDS.get(value) or int(value)
+            break
+    year = None
+    for pattern in _YEAR_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            value = int(match.group(1))
+            year = value if value >= 100 else 2000 + value
+            break
+    return year, quarter
+
+def rule_hits(question: str) -> Dict[str, int]:
+    text = question.lower()
+    return {intent: sum(1 for pattern in INTENT_RULES[intent] if pattern.search(text)) for intent in INTENTS}
+
+def _example_vectors() -> Dict[str, np.ndarray]:
+    # Unit vectors of every example, embedded once per process in a single batch
+    def create():
+        texts = [t for intent in INTENTS for t in INTENT_EXAMPLES[intent]]
+        vectors = np.asarray(embedding_service.encode_many(texts), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        out, start = {}, 0
+        for intent in INTENTS:
+            out[intent] = vectors[start:start + len(INTENT_EXAMPLES[intent])]
+            start += len(INTENT_EXAMPLES[intent])
+        return out
+    return get_or_create("router_examples", create)
+
+def similarity_scores(question: str) -> Dict[str, float]:
+    # A copy: encode() hands out the embedding cache's own array, which retrieval reuses
+    vector = np.array(embedding_service.encode(question), dtype=np.float32, copy=True)
+    vector /= max(float(np.linalg.norm(vector)), 1e-12)
+    return {intent: float(np.max(examples @ vector)) for intent, examples in _example_vectors().items()}
+
+def classify(question: str, year: Optional[int] = None, quarter: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Route a question without an LLM call. Keyword rules and similarity to
+    INTENT_EXAMPLES are combined into a softmax over INTENTS; the period is
+    parsed from the question unless `year`/`quarter` are given. Returns
+    intent, confidence, year, quarter and the per-intent scores.
+    """
+    with span("router") as attributes:
+        hits = rule_hits(question)
+        try:
+            similarity = similarity_scores(question)
+        except Exception as e:
+            # Rules alone still route the obvious cases
+            print(f"Router embeddings unavailable, using rules only: {e}")
+            similarity = {intent: 0.0 for intent in INTENTS}
+        combined = np.array([similarity[i] + ROUTER_RULE_WEIGHT * hits[i] for i in INTENTS])
+        probs = np.exp((combined - combined.max()) / ROUTER_TEMPERATURE)
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        parsed_year, parsed_quarter = extract_period(question)
+        route = {
+            "intent": INTENTS[best],
+            "confidence": round(float(probs[best]), 3),
+            "year": year if year is not None else parsed_year,
+            "quarter": quarter if quarter is not None else parsed_quarter,
+            "scores": {intent: round(float(p), 3) for intent, p in zip(INTENTS, probs)},
+        }
+        attributes.update(intent=route["intent"], confidence=route["confidence"])
+        return route
+
+def needs_planner(route: Dict[str, Any]) -> bool:
+    if route["confidence"] < ROUTER_CONFIDENCE:
+        return True
+    # The financials lookup needs a concrete quarter; let the planner work one out
+    return route["intent"] == "financial" and (route["year"] is None or route["quarter"] is None)
@@ -1,67 +1,249 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from typing import TypedDict, Optional, Dict, Any
-
-from langgraph.graph import StateGraph, END
-from langchain_core.runnables import RunnableLambda
+from typing import TypedDict, Optional, Dict, Any, Iterator, List, Tuple
 
 # Import our Pinecone functions and LLM chat function
-from  pinecone_embeds import query_pinecone, INDEX_NAME, pc
-from  llm_chat import get_llm_response
+from  pinecone_embeds import query_pinecone, index_stats, embedding_service, on_upsert, fetch_values, fetch_texts
+from  llm_chat import MODEL_PRICES, get_llm_response, stream_llm_response
+from  llm_hedging import get_hedged_llm_response
+from  llm_providers import provider_available
+from  query_router import extract_period
+from  context_packer import CONTEXT_TOKEN_BUDGET, group_chunks, pack_context
+from  resources import get_graph
+from  semantic_cache import SemanticCache
+from  telemetry import gauge, in_context, record_cache, span
 
 # Load environment variables from .env
 load_dotenv()
 
+# Primary model for RAG answers; slow calls are hedged to a backup (see llm_hedging)
+RAG_LLM = os.getenv("RAG_LLM", "gpt-4o")
+
+# Map-reduce mode: summarise chunk groups in parallel with a cheap model, then combine
+RAG_MAP_REDUCE = os.getenv("RAG_MAP_REDUCE", "false").lower() in ("1", "true", "yes")
+RAG_MAP_LLM = os.getenv("RAG_MAP_LLM")  # defaults to the cheapest available provider
+RAG_MAP_TOKENS = int(os.getenv("RAG_MAP_TOKENS", "2000"))
+RAG_MAP_CONCURRENCY = int(os.getenv("RAG_MAP_CONCURRENCY", "4"))
+# Each map call sees a fraction of the context, so more of it can be retrieved in total
+RAG_MAP_REDUCE_CONTEXT_TOKENS = int(os.getenv("RAG_MAP_REDUCE_CONTEXT_TOKENS", str(CONTEXT_TOKEN_BUDGET * 4)))
+
+_map_executor = ThreadPoolExecutor(max_workers=RAG_MAP_CONCURRENCY, thread_name_prefix="rag-map")
+
 # Define the state type for our RAG agent
 class RAGState(TypedDict, total=False):
     question: str
     top_k: Optional[int]
+    year: Optional[int]
+    quarter: Optional[int]
+    map_reduce: Optional[bool]
+    chunks: List[str]
+    period_note: Optional[str]
+    partial_summaries: List[str]
     rag_output: str
 
-def rag_agent(state: RAGState) -> Dict[str, Any]:
-    # Get the user's query or a default one
-    query = state.get("question", "Summarize NVIDIA's performance.")
-    
-    # Set a default top_k value of 500 if not provided by the user
-    user_top_k = state.get("top_k", 500)
-    
-    # Retrieve the current record count from the Pinecone index
-    index = pc.Index(INDEX_NAME)
-    stats = index.describe_index_stats()
+# Answers to questions that mean the same thing, reused across requests
+# (shares the embedding service, so the retrieval step reuses the question's vector;
+# "revenue in Q1 2024" and "revenue in Q2 2024" are kept apart by the period they name)
+rag_cache = SemanticCache(encode=embedding_service.encode, period=extract_period)
+gauge("nvidia_rag_answer_cache", "Semantic RAG answer cache: hits, misses and entries.", ("stat",),
+      lambda: [({"stat": stat}, value) for stat, value in rag_cache.stats().items()])
+on_upsert(rag_cache.invalidate)
+
+def period_label(year: Optional[int], quarter: Optional[int]) -> str:
+    return " ".join(part for part in (f"Q{quarter}" if quarter is not None else None,
+                                      str(year) if year is not None else None) if part)
+
+def with_note(answer: str, note: Optional[str]) -> str:
+    return f"{note}\n\n{answer}" if note else answer
+
+def retrieve_chunks(query: str, user_top_k: int = 500, year: Optional[int] = None, quarter: Optional[int] = None,
+                    token_budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[List[str], Optional[str]]:
+    """Chunks for the prompt, plus a note for the answer when the period filter had to be dropped."""
+    with span("rag.retrieve"):
+        return _retrieve_chunks(query, user_top_k, year, quarter, token_budget)
+
+def _retrieve_chunks(query: str, user_top_k: int, year: Optional[int], quarter: Optional[int],
+                     token_budget: int) -> Tuple[List[str], Optional[str]]:
+    # Retrieve the current record count from the cached Pinecone index stats
+    stats = index_stats.get()
     total_records = stats.get("total_vector_count", 0)
     
     # Compute the effective top_k as the minimum of user_top_k, total_records, and 500
     actual_top_k = min(user_top_k, total_records, 500)
     
-    # Query Pinecone for relevant chunks
-    results = query_pinecone(query_text=query, top_k=actual_top_k)
+    # Query Pinecone for relevant chunks in the requested period: IDs, scores and small metadata only
+    results = query_pinecone(query_text=query, top_k=actual_top_k, year=year, quarter=quarter)
+    note = None
+    if not results.get("matches") and (year is not None or quarter is not None):
+        # Vectors ingested before period metadata existed can't match the filter; they may stand in,
+        # but documents tagged with another period never answer for this one
+        unfiltered = query_pinecone(query_text=query, top_k=actual_top_k)
+        untagged = [m for m in unfiltered.get("matches", [])
+                    if not {"year", "quarter"} & set(m.get("metadata") or {})]
+        if untagged:
+            label = period_label(year, quarter)
+            print(f"No matches for {label}; using {len(untagged)} matches without period metadata.")
+            note = (f"Note: no documents are tagged with {label}, so this answer draws on documents "
+                    "without period information and may cover other periods.")
+            year = quarter = None
+        results = {"matches": untagged}
+    
+    # Keep the best-scoring distinct chunks that fit the prompt token budget; vectors for
+    # near-duplicate checks and the chunk text are fetched only for those candidates
+    with span("rag.pack_context") as attributes:
+        chunks, pack_stats = pack_context(results.get("matches", []), model=RAG_LLM, token_budget=token_budget,
+                                          fetch_values=lambda ids: fetch_values(ids, year, quarter),
+                                          fetch_texts=fetch_texts)
+        attributes.update(pack_stats)
+    print(f"Packed {len(chunks)}/{pack_stats['candidates']} chunks "
+          f"({pack_stats['tokens']} tokens, {pack_stats['duplicates']} duplicates dropped)")
+    return chunks, note
+
+def retrieve_context(query: str, user_top_k: int = 500, year: Optional[int] = None,
+                     quarter: Optional[int] = None) -> Tuple[str, Optional[str]]:
+    chunks, note = retrieve_chunks(query, user_top_k, year, quarter)
+    return "\n\n".join(chunks), note
+
+def rag_agent(state: RAGState) -> Dict[str, Any]:
+    # Get the user's query or a default one
+    query = state.get("question", "Summarize NVIDIA's performance.")
     
-    # Extract and combine text from the returned matches
-    chunks = [
-        m.get("metadata", {}).get("text", "") or m.get("text", "")
-        for m in results.get("matches", [])
-    ]
-    context = " ".join(chunks)
+    # Set a default top_k value of 500 if not provided by the user
+    user_top_k = state.get("top_k", 500)
+    year, quarter = state.get("year"), state.get("quarter")
+
+    # Serve paraphrases of a recent question straight from the semantic cache
+    cached, question_vector = rag_cache.lookup(query, year, quarter)
+    record_cache("rag_answer", cached is not None)
+    if cached is not None:
+        state["rag_output"] = cached
+        return state
     
+    context, note = retrieve_context(query, user_top_k, year, quarter)
     if not context:
         return {"rag_output": "No relevant content found in Pinecone index."}
     
     # Build a PDF-like data structure for the LLM
     pdf_data = {"pdf_content": context, "tables": []}
     
-    # Force the LLM choice to GPT‑4O mini by passing "gpt-4o"
-    response = get_llm_response(pdf_data, query, "gpt-4o")
+    # GPT‑4o mini by default; a second provider races it when it runs past its tail latency
+    response = get_hedged_llm_response(pdf_data, query, RAG_LLM)
     
-    state["rag_output"] = response["answer"]
+    state["rag_output"] = with_note(response["answer"], note)
+    if not response["answer"].startswith("Error:"):
+        rag_cache.store(query, state["rag_output"], year, quarter, vector=question_vector)
     return state
 
+def stream_rag_answer(question: str, top_k: int = 500, year: Optional[int] = None,
+                      quarter: Optional[int] = None) -> Iterator[str]:
+    """Same pipeline as rag_agent, but yields the answer as the LLM produces it."""
+    cached, question_vector = rag_cache.lookup(question, year, quarter)
+    record_cache("rag_answer", cached is not None)
+    if cached is not None:
+        yield cached
+        return
+
+    context, note = retrieve_context(question, top_k, year, quarter)
+    if not context:
+        yield "No relevant content found in Pinecone index."
+        return
+
+    if note:
+        yield with_note("", note)
+    parts = []
+    for token in stream_llm_response({"pdf_content": context, "tables": []}, question, RAG_LLM):
+        parts.append(token)
+        yield token
+    answer = "".join(parts)
+    if answer and not answer.startswith("Error:"):
+        rag_cache.store(question, with_note(answer, note), year, quarter, vector=question_vector)
+
+# --- Map-reduce mode ---
+def map_llm() -> str:
+    if RAG_MAP_LLM:
+        return RAG_MAP_LLM
+    available = [m for m in MODEL_PRICES if provider_available(m)]
+    return min(available, key=MODEL_PRICES.get) if available else RAG_LLM
+
+def retrieve_for_map(state: RAGState) -> Dict[str, Any]:
+    query = state.get("question", "Summarize NVIDIA's performance.")
+    year, quarter = state.get("year"), state.get("quarter")
+    cached, _ = rag_cache.lookup(query, year, quarter)
+    record_cache("rag_answer", cached is not None)
+    if cached is not None:
+        return {"rag_output": cached}
+    chunks, note = retrieve_chunks(query, state.get("top_k", 500), year, quarter,
+                                   token_budget=RAG_MAP_REDUCE_CONTEXT_TOKENS)
+    if not chunks:
+        return {"rag_output": "No relevant content found in Pinecone index."}
+    return {"chunks": chunks, "period_note": note}
+
+def _summarize_group(question: str, group: List[str], model: str) -> str:
+    instruction = (f"Summarize every fact, figure and date in this excerpt that helps answer: {question}\n"
+                   "Reply 'Nothing relevant.' if the excerpt does not help.")
+    with span("rag.map_call", model=model, chunks=len(group)):
+        return get_llm_response({"pdf_content": "\n\n".join(group)}, instruction, model)["answer"]
+
+def map_summaries(state: RAGState) -> Dict[str, Any]:
+    question = state.get("question", "Summarize NVIDIA's performance.")
+    model = map_llm()
+    groups = group_chunks(state.get("chunks", []), model, RAG_MAP_TOKENS)
+    started = time.perf_counter()
+    # Bounded by the executor size, so wall time is about ceil(groups / workers) map calls
+    with span("rag.map", groups=len(groups)):
+        # Wrapped here, in the request's thread: in_context copies the context of the thread it runs in
+        calls = [in_context(_summarize_group, question, group, model) for group in groups]
+        answers = list(_map_executor.map(lambda call: call(), calls))
+    partials = [a for a in answers if not a.startswith("Error:") and a.strip() != "Nothing relevant."]
+    print(f"Mapped {len(groups)} chunk groups with {model} in {time.perf_counter() - started:.2f}s "
+          f"({len(groups) - len(partials)} dropped)")
+    if not partials and groups:
+        # Every map call failed; reduce over the best-ranked raw group instead
+        partials = ["\n\n".join(groups[0])]
+    return {"partial_summaries": partials}
+
+def reduce_summaries(state: RAGState) -> Dict[str, Any]:
+    query = state.get("question", "Summarize NVIDIA's performance.")
+    partials = state.get("partial_summaries", [])
+    content = "\n\n".join(f"Excerpt summary {i + 1}:\n{p}" for i, p in enumerate(partials))
+    with span("rag.reduce", partials=len(partials)):
+        response = get_hedged_llm_response({"pdf_content": content}, query, RAG_LLM)
+    answer = with_note(response["answer"], state.get("period_note"))
+    if not response["answer"].startswith("Error:"):
+        rag_cache.store(query, answer, state.get("year"), state.get("quarter"))
+    return {"rag_output": answer}
+
+def choose_mode(state: RAGState) -> str:
+    map_reduce = state.get("map_reduce")
+    return "map_reduce" if (RAG_MAP_REDUCE if map_reduce is None else map_reduce) else "single"
+
+def after_retrieve(state: RAGState) -> str:
+    # Cache hits and empty retrievals already have their output
+    return "done" if state.get("rag_output") else "map"
+
 def build_graph():
+    # LangGraph is only needed to compile the graph; keep it off the import path
+    from langgraph.graph import StateGraph, END
+    from langchain_core.runnables import RunnableLambda
+
     builder = StateGraph(RAGState)
     builder.add_node("RAGAgent", RunnableLambda(rag_agent))
-    builder.set_entry_point("RAGAgent")
+    builder.add_node("Retrieve", RunnableLambda(retrieve_for_map))
+    builder.add_node("MapSummaries", RunnableLambda(map_summaries))
+    builder.add_node("ReduceSummaries", RunnableLambda(reduce_summaries))
+    builder.set_conditional_entry_point(choose_mode, {"single": "RAGAgent", "map_reduce": "Retrieve"})
+    builder.add_conditional_edges("Retrieve", after_retrieve, {"map": "MapSummaries", "done": END})
+    builder.add_edge("MapSummaries", "ReduceSummaries")
+    builder.add_edge("ReduceSummaries", END)
     builder.add_edge("RAGAgent", END)
     return builder.compile()
 
+def get_rag_graph():
+    # Compiled once per process and shared by every request
+    return get_graph("rag", build_graph)
+
 if __name__ == "__main__":
     graph = build_graph()
     
@@ -0,0 +1,321 @@
+# backend/report_builder.py
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from rag_agent import get_rag_graph, stream_rag_answer
+from financials_snapshot import get_quarter_financials
+from web_tools import normalize_query, tavily_search
+from pinecone_embeds import embedding_service
+from llm_providers import DeadlineExceeded, deadline
+from resources import BatchMemo
+from charts import render_metric_chart
+from artifacts import publish, table_bytes
+from telemetry import STAGE_ERRORS, Trace, attach_trace, in_context, span, start_trace
+
+# Per-agent deadlines in seconds
+AGENT_TIMEOUTS = {
+    "rag": float(os.getenv("RAG_AGENT_TIMEOUT", "90")),
+    "financial": float(os.getenv("FINANCIAL_AGENT_TIMEOUT", "30")),
+    "web": float(os.getenv("WEB_AGENT_TIMEOUT", "20")),
+}
+
+# Report section each agent fills in
+AGENT_SECTIONS = {
+    "rag": "historical",
+    "financial": "financial_summary",
+    "web": "web",
+}
+
+# png or svg
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png")
+
+# Worker threads per agent
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "8"))
+
+# Blocking SDK calls never run on the event loop thread, and each agent has its own
+# pool so a stalled LLM call can't leave the financial and web agents queued behind it
+_agent_executors = {
+    name: ThreadPoolExecutor(max_workers=AGENT_WORKERS, thread_name_prefix=f"report-{name}")
+    for name in AGENT_SECTIONS
+}
+
+# --- RAG Agent (Historical Performance) ---
+def run_rag_agent(question: str, year: Optional[int], quarter: Optional[int], top_k: int = 500) -> Dict[str, Any]:
+    state = {"question": question, "top_k": top_k}
+    if year is not None:
+        state["year"] = year
+    if quarter is not None:
+        state["quarter"] = quarter
+    result_state = get_rag_graph().invoke(state)
+    return {"historical": result_state.get("rag_output", "No RAG output returned.")}
+
+# --- Financial Metrics (Snowflake Agent) ---
+def run_financial_agent(question: str, year: Optional[int], quarter: Optional[int], top_k: int = 500) -> Dict[str, Any]:
+    # Served from the in-process columnar snapshot; Snowflake is only hit on refresh
+    df_financial = get_quarter_financials(year, quarter)
+    if df_financial.empty:
+        return {"financial_summary": "No financial data found for the selected Year/Quarter."}
+
+    # Rendered in the chart process pool; repeated quarters are a cache hit
+    _, chart = render_metric_chart(df_financial, metric="MARKETCAP", detailed=False, fmt=CHART_FORMAT)
+    # Chart and table are served from /artifacts by content hash, so clients cache them across reports;
+    # the records stay in the section only for callers that ask for them (see compact_financials)
+    return {
+        "financial_summary": df_financial.to_dict(orient="records"),
+        "financial_chart_url": publish(chart, CHART_FORMAT),
+        "financial_table_url": publish(table_bytes(df_financial), "arrow"),
+    }
+
+# --- Web Insights (Web Search Agent) ---
+def run_web_agent(question: str, year: Optional[int], quarter: Optional[int], top_k: int = 500) -> Dict[str, Any]:
+    return {"web": tavily_search(question)}
+
+AGENT_RUNNERS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "rag": run_rag_agent,
+    "financial": run_financial_agent,
+    "web": run_web_agent,
+}
+
+def select_agents(agents: List[str], year: Optional[int], quarter: Optional[int]) -> List[str]:
+    selected = [name for name in AGENT_RUNNERS if name in agents]
+    # The financial agent needs a concrete period to query
+    if year is None or quarter is None:
+        selected = [name for name in selected if name != "financial"]
+    return selected
+
+async def run_agent(name: str, question: str, year: Optional[int], quarter: Optional[int],
+                    top_k: int = 500, timeout: Optional[float] = None,
+                    runners: Optional[Dict[str, Callable[..., Dict[str, Any]]]] = None) -> Dict[str, Any]:
+    """
+    Run one agent in the worker pool under its own deadline.
+    On timeout or failure the agent's section is replaced by a note and the
+    reason is recorded under "missing_agents".
+    """
+    timeout = AGENT_TIMEOUTS.get(name) if timeout is None else timeout
+    try:
+        return await _run_in_pool(name, lambda: (runners or AGENT_RUNNERS)[name](question, year, quarter, top_k),
+                                  timeout)
+    except asyncio.TimeoutError:
+        STAGE_ERRORS.inc(stage=f"agent.{name}")
+        return missing_section(name, f"timed out after {timeout:g}s")
+    except Exception as e:
+        print(f"Error running {name} agent: {e}")
+        return missing_section(name, f"failed: {e}")
+
+async def _run_in_pool(name: str, fn: Callable[[], Dict[str, Any]], timeout: Optional[float]) -> Dict[str, Any]:
+    """
+    Run `fn` in the agent's pool within `timeout` seconds of now, time spent
+    queued behind busy workers included. The same deadline bounds the LLM
+    calls, web searches, vector queries and chart renders inside `fn`, so a
+    timed-out agent stops instead of holding its thread.
+    """
+    loop = asyncio.get_running_loop()
+    expires = None if timeout is None else time.monotonic() + timeout
+
+    def run() -> Dict[str, Any]:
+        remaining = None if expires is None else expires - time.monotonic()
+        with deadline(remaining), span(f"agent.{name}"):
+            if remaining is not None and remaining <= 0:
+                # Picked up after the caller gave up: don't start work nobody will read
+                raise DeadlineExceeded(f"{name} agent waited {timeout:g}s for a worker")
+            return fn()
+
+    # Cancelling the awaited future (timeout or client gone) also drops the call if it is still queued
+    future = loop.run_in_executor(_agent_executors[name], in_context(run))
+    return await asyncio.wait_for(future, timeout=timeout)
+
+def missing_section(name: str, reason: str) -> Dict[str, Any]:
+    return {
+        AGENT_SECTIONS[name]: f"The {name} agent {reason}; this section is unavailable.",
+        "missing_agents": {name: reason},
+    }
+
+def compact_financials(section: Dict[str, Any]) -> Dict[str, Any]:
+    # With the table at financial_table_url, inlining its records would send it twice
+    records = section.get("financial_summary")
+    if section.get("financial_table_url") and isinstance(records, list):
+        section["financial_summary"] = f"{len(records)} valuation records, table at financial_table_url."
+    return section
+
+def merge_section(report: Dict[str, Any], section: Dict[str, Any]) -> None:
+    missing = section.pop("missing_agents", None)
+    report.update(section)
+    if missing:
+        report.setdefault("missing_agents", {}).update(missing)
+
+async def generate_report(question: str, year: Optional[int], quarter: Optional[int], agents: List[str],
+                          top_k: int = 500, timeouts: Optional[Dict[str, float]] = None,
+                          include_timings: bool = False,
+                          runners: Optional[Dict[str, Callable[..., Dict[str, Any]]]] = None,
+                          inline_financials: bool = False) -> Dict[str, Any]:
+    # Fan out the selected agents; total latency is the slowest agent, not the sum
+    timeouts = timeouts or {}
+    names = select_agents(agents, year, quarter)
+    with start_trace() as trace:
+        sections = await asyncio.gather(*[
+            run_agent(name, question, year, quarter, top_k, timeouts.get(name), runners)
+            for name in names
+        ])
+
+    report: Dict[str, Any] = {}
+    for section in sections:
+        merge_section(report, section if inline_financials else compact_financials(section))
+    if include_timings:
+        # Per-stage spans recorded while this report was built
+        report["timings"] = trace.summary()
+    return report
+
+# Upper bound on questions of one batch that run at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+def batch_runners(memo: BatchMemo) -> Dict[str, Callable[..., Dict[str, Any]]]:
+    """
+    Agent runners that share work across one batch: the financial section
+    depends only on the period, web results only on the normalised query,
+    and identical questions get one RAG answer. Each caller gets its own
+    copy of the section, since merge_section mutates it.
+    """
+    def rag(question, year, quarter, top_k=500):
+        key = ("rag", normalize_query(question), year, quarter, top_k)
+        return dict(memo.get(key, lambda: run_rag_agent(question, year, quarter, top_k)))
+
+    def financial(question, year, quarter, top_k=500):
+        return dict(memo.get(("financial", year, quarter),
+                             lambda: run_financial_agent(question, year, quarter, top_k)))
+
+    def web(question, year, quarter, top_k=500):
+        return dict(memo.get(("web", normalize_query(question)),
+                             lambda: run_web_agent(question, year, quarter, top_k)))
+
+    return {"rag": rag, "financial": financial, "web": web}
+
+async def generate_batch(requests: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY,
+                         timeouts: Optional[Dict[str, float]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Build one report per request dict (question, year, quarter, include_agents,
+    optional top_k and inline_financials) with at most `concurrency` in flight, yielding
+      {"event": "report", "index": i, "question": ..., "report": {...}}
+    in completion order, then {"event": "done", ...} with batch totals.
+    """
+    started = time.perf_counter()
+    memo = BatchMemo()
+    runners = batch_runners(memo)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    # Every question's embedding in one forward pass; the RAG agents then hit the cache
+    questions = [r["question"] for r in requests]
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_agent_executors["rag"], embedding_service.prime, questions)
+    except Exception as e:
+        print(f"Batch embedding failed, questions will be encoded individually: {e}")
+
+    async def build(index: int, request: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                report = await generate_report(
+                    request["question"], request.get("year"), request.get("quarter"),
+                    request.get("include_agents", list(AGENT_RUNNERS)), request.get("top_k", 500),
+                    timeouts, runners=runners, inline_financials=request.get("inline_financials", False))
+                return {"event": "report", "index": index, "question": request["question"], "report": report}
+            except Exception as e:
+                print(f"Error building batch report {index}: {e}")
+                return {"event": "error", "index": index, "question": request["question"], "error": str(e)}
+
+    tasks = [asyncio.create_task(build(i, r)) for i, r in enumerate(requests)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # Client went away: don't keep building reports nobody will read
+        for task in tasks:
+            task.cancel()
+    yield {"event": "done", "reports": len(requests), "seconds": round(time.perf_counter() - started, 3),
+           "shared_work": memo.stats()}
+
+async def _stream_rag_section(queue: asyncio.Queue, question: str, year: Optional[int], quarter: Optional[int],
+                              top_k: int, timeout: float) -> Dict[str, Any]:
+    # Tokens are forwarded from the worker thread as they arrive; the full answer becomes the section
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+
+    def produce() -> Dict[str, Any]:
+        parts = []
+        for token in stream_rag_answer(question, top_k, year, quarter):
+            if cancelled.is_set():
+                break
+            parts.append(token)
+            loop.call_soon_threadsafe(queue.put_nowait, {"event": "token", "agent": "rag", "text": token})
+        return {"historical": "".join(parts) or "No RAG output returned."}
+
+    try:
+        return await _run_in_pool("rag", produce, timeout)
+    except asyncio.TimeoutError:
+        STAGE_ERRORS.inc(stage="agent.rag")
+        return missing_section("rag", f"timed out after {timeout:g}s")
+    except Exception as e:
+        print(f"Error running rag agent: {e}")
+        return missing_section("rag", f"failed: {e}")
+    finally:
+        # Stop a still-running producer from emitting tokens nobody will read
+        cancelled.set()
+
+async def stream_report(question: str, year: Optional[int], quarter: Optional[int], agents: List[str],
+                        top_k: int = 500, timeouts: Optional[Dict[str, float]] = None,
+                        include_timings: bool = False, inline_financials: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield report events as soon as they are ready:
+      {"event": "token", "agent": "rag", "text": ...}     LLM output for the RAG section
+      {"event": "section", "agent": name, "data": {...}}  a finished agent section
+      {"event": "done", "missing_agents": {...}}          always last (plus "timings" when requested)
+    """
+    timeouts = timeouts or {}
+    trace = Trace()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    missing: Dict[str, str] = {}
+
+    async def produce(name: str) -> None:
+        attach_trace(trace)
+        try:
+            timeout = timeouts.get(name, AGENT_TIMEOUTS[name])
+            if name == "rag":
+                section = await _stream_rag_section(queue, question, year, quarter, top_k, timeout)
+            else:
+                section = await run_agent(name, question, year, quarter, top_k, timeout)
+            missing.update(section.pop("missing_agents", {}))
+            if not inline_financials:
+                compact_financials(section)
+            await queue.put({"event": "section", "agent": name, "data": section})
+        finally:
+            await queue.put(done)
+
+    tasks = [asyncio.create_task(produce(name)) for name in select_agents(agents, year, quarter)]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await queue.get()
+            if event is done:
+                remaining -= 1
+                continue
+            yield event
+        done_event = {"event": "done", "missing_agents": missing}
+        if include_timings:
+            done_event["timings"] = trace.summary()
+        yield done_event
+    finally:
+        # Client went away: stop waiting on agents that are still running
+        for task in tasks:
+            task.cancel()
+
+async def to_ndjson(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    # One JSON object per line; timestamps in financial records go through FastAPI's encoder
+    async for event in events:
+        yield json.dumps(jsonable_encoder(event)) + "\n"
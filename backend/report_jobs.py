@@ -0,0 +1,220 @@
+# backend/report_jobs.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from report_builder import AGENT_RUNNERS, generate_report, select_agents
+from resources import get_or_create
+from telemetry import counter
+
+REPORT_JOBS_PATH = os.getenv("REPORT_JOBS_PATH", "report_jobs.db")
+# Reports built at the same time in the background; each one fans out to the agent pool
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "4"))
+# Finished jobs (and their idempotency keys) are kept this long, in seconds
+REPORT_JOB_TTL = float(os.getenv("REPORT_JOB_TTL", str(24 * 3600)))
+
+PENDING = ("queued", "running")
+
+REPORT_JOBS = counter("nvidia_report_jobs_total", "Report job submissions by outcome (created, reused).",
+                      ("outcome",))
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused with a different request."""
+
+
+def request_hash(request: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class JobStore:
+    """
+    Report jobs in SQLite: the request, status, per-agent progress and the
+    finished report, so polling or a reconnect after a restart reads the
+    stored result instead of building the report again.
+    """
+
+    def __init__(self, path: str = REPORT_JOBS_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, request_hash TEXT NOT NULL, "
+                "request TEXT NOT NULL, status TEXT NOT NULL, progress TEXT, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (request_hash, status)")
+            # Several keys can point at one job when identical submissions collapse
+            conn.execute("CREATE TABLE IF NOT EXISTS job_keys (key TEXT PRIMARY KEY, job_id TEXT NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def _find(self, conn: sqlite3.Connection, key: Optional[str], digest: str) -> Optional[sqlite3.Row]:
+        if key is not None:
+            row = conn.execute("SELECT jobs.* FROM job_keys JOIN jobs ON jobs.id = job_keys.job_id "
+                               "WHERE job_keys.key = ?", (key,)).fetchone()
+            if row is not None:
+                if row["request_hash"] != digest:
+                    raise IdempotencyConflict(f"Idempotency key {key!r} was already used for a different request.")
+                return row
+        # An identical request that hasn't finished yet is the same job
+        placeholders = ",".join("?" * len(PENDING))
+        return conn.execute(
+            f"SELECT * FROM jobs WHERE request_hash = ? AND status IN ({placeholders}) ORDER BY created_at LIMIT 1",
+            (digest, *PENDING),
+        ).fetchone()
+
+    def create(self, request: Dict[str, Any], key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Returns (job, created); an existing job is returned for a known key or an identical pending request."""
+        digest = request_hash(request)
+        conn = self._connection()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so two submissions can't both miss the lookup
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._find(conn, key, digest)
+            if row is None:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, request_hash, request, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'queued', ?, ?)",
+                    (job_id, digest, json.dumps(request), now, now),
+                )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                created = True
+            else:
+                created = False
+            if key is not None:
+                # A retry with this key after the job finishes must still find it
+                conn.execute("INSERT OR IGNORE INTO job_keys (key, job_id) VALUES (?, ?)", (key, row["id"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self._to_dict(row), created
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        for name in ("progress", "result"):
+            if name in fields:
+                fields[name] = json.dumps(jsonable_encoder(fields[name]))
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._connection().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def pending(self) -> List[str]:
+        placeholders = ",".join("?" * len(PENDING))
+        return [row["id"] for row in self._connection().execute(
+            f"SELECT id FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at", PENDING)]
+
+    def prune(self, ttl: float = REPORT_JOB_TTL) -> int:
+        placeholders = ",".join("?" * len(PENDING))
+        with self._connection() as conn:
+            cur = conn.execute(f"DELETE FROM jobs WHERE status NOT IN ({placeholders}) AND updated_at < ?",
+                               (*PENDING, time.time() - ttl))
+            conn.execute("DELETE FROM job_keys WHERE job_id NOT IN (SELECT id FROM jobs)")
+        return cur.rowcount
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "request": json.loads(row["request"]),
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        if row["result"]:
+            job["result"] = json.loads(row["result"])
+        if row["error"]:
+            job["error"] = row["error"]
+        return job
+
+
+class ReportJobQueue:
+    """
+    Runs /report requests in a local worker pool, outside any HTTP request.
+    Jobs left queued or running by a previous process (this assumes a single
+    API process per job store) are picked up again on start.
+    """
+
+    def __init__(self, store: JobStore, workers: int = REPORT_JOB_WORKERS):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+        for job_id in store.pending():
+            print(f"Resuming report job {job_id}")
+            self._executor.submit(self._run, job_id)
+
+    def submit(self, request: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+        self.store.prune()
+        job, created = self.store.create(request, key)
+        REPORT_JOBS.inc(outcome="created" if created else "reused")
+        if created:
+            self._executor.submit(self._run, job["job_id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def _progress_runners(self, job_id: str, agents: List[str]) -> Dict[str, Callable[..., Dict[str, Any]]]:
+        progress = {"agents": agents, "completed": []}
+        lock = threading.Lock()
+
+        def track(name: str, runner: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+            def run(*args, **kwargs) -> Dict[str, Any]:
+                section = runner(*args, **kwargs)
+                with lock:
+                    progress["completed"].append(name)
+                    self.store.update(job_id, progress=progress)
+                return section
+            return run
+
+        self.store.update(job_id, status="running", progress=progress)
+        return {name: track(name, runner) for name, runner in AGENT_RUNNERS.items()}
+
+    def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        request = job["request"]
+        agents = select_agents(request["include_agents"], request.get("year"), request.get("quarter"))
+        try:
+            runners = self._progress_runners(job_id, agents)
+            report = asyncio.run(generate_report(
+                request["question"], request.get("year"), request.get("quarter"), request["include_agents"],
+                request.get("top_k", 500), include_timings=request.get("include_timings", False),
+                runners=runners, inline_financials=request.get("inline_financials", False)))
+            self.store.update(job_id, status="succeeded", result=report)
+        except Exception as e:
+            print(f"Report job {job_id} failed: {e}")
+            self.store.update(job_id, status="failed", error=str(e))
+
+    def shutdown(self) -> None:
+        # Unfinished jobs stay "running" in the store and resume on the next start
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_job_queue() -> ReportJobQueue:
+    return get_or_create("report_jobs", lambda: ReportJobQueue(JobStore()))
@@ -0,0 +1,64 @@
+# backend/report_routes.py
+from typing import List, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from report_builder import BATCH_CONCURRENCY, generate_batch, stream_report, to_ndjson
+from report_jobs import IdempotencyConflict, get_job_queue
+
+
+class ReportRequest(BaseModel):
+    question: str
+    year: Optional[int] = None
+    quarter: Optional[int] = None
+    top_k: int = 500
+    include_agents: List[str] = ["rag", "financial", "web"]
+    # Adds a per-stage timing breakdown to the response
+    include_timings: bool = False
+    # Also return the financial records inline; by default they are only at financial_table_url
+    inline_financials: bool = False
+
+class BatchReportRequest(BaseModel):
+    reports: List[ReportRequest]
+    concurrency: int = BATCH_CONCURRENCY
+
+
+# Streaming, batch and background report endpoints shared by both API apps
+report_router = APIRouter()
+
+@report_router.post("/report/stream")
+async def stream_report_endpoint(request: ReportRequest):
+    # NDJSON: each agent's section (and the RAG answer's tokens) as soon as it is ready
+    events = stream_report(request.question, request.year, request.quarter, request.include_agents,
+                           top_k=request.top_k, include_timings=request.include_timings,
+                           inline_financials=request.inline_financials)
+    return StreamingResponse(to_ndjson(events), media_type="application/x-ndjson")
+
+@report_router.post("/reports/batch")
+async def batch_report_endpoint(request: BatchReportRequest):
+    # NDJSON: one line per report as it completes; periods, searches and questions shared
+    # between reports are computed once
+    items = [{"question": r.question, "year": r.year, "quarter": r.quarter,
+              "include_agents": r.include_agents, "top_k": r.top_k, "inline_financials": r.inline_financials}
+             for r in request.reports]
+    events = generate_batch(items, max(1, min(request.concurrency, BATCH_CONCURRENCY)))
+    return StreamingResponse(to_ndjson(events), media_type="application/x-ndjson")
+
+@report_router.post("/report/jobs", status_code=202)
+def submit_report_job(request: ReportRequest, idempotency_key: Optional[str] = Header(None)):
+    # Long reports run in the background job pool; resubmitting with the same Idempotency-Key
+    # (or an identical request while it is still running) returns the existing job
+    try:
+        return get_job_queue().submit(request.model_dump(), idempotency_key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@report_router.get("/report/jobs/{job_id}")
+def get_report_job(job_id: str):
+    # Status, per-agent progress, and the stored report once the job has succeeded
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown report job.")
+    return job
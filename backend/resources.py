@@ -0,0 +1,177 @@
+# backend/resources.py
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Process-wide registry of expensive, reusable objects (compiled graphs, index handles)
+_registry: Dict[Hashable, Any] = {}
+_registry_lock = threading.RLock()
+
+def get_or_create(key: Hashable, factory: Callable[[], Any]) -> Any:
+    obj = _registry.get(key)
+    if obj is not None:
+        return obj
+    with _registry_lock:
+        # Another thread may have built it while we waited for the lock
+        if key not in _registry:
+            _registry[key] = factory()
+        return _registry[key]
+
+def get_graph(name: str, build_fn: Callable[[], Any]) -> Any:
+    # Compiled LangGraph graphs are stateless between invocations, so one per process is enough
+    return get_or_create(("graph", name), build_fn)
+
+def get_index(client: Any, index_name: str) -> Any:
+    return get_or_create(("index", index_name), lambda: client.Index(index_name))
+
+
+class TTLCache:
+    """
+    Holds a single value produced by `loader`, refreshed after `ttl` seconds.
+    Stale values are served while a background thread reloads them, so only
+    the very first call ever waits on the loader.
+    """
+
+    def __init__(self, loader: Callable[[], Any], ttl: float = 60.0):
+        self.loader = loader
+        self.ttl = ttl
+        self._value: Optional[Any] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _load(self) -> Any:
+        value = self.loader()
+        self._value = value
+        self._loaded_at = time.monotonic()
+        return value
+
+    def _background_load(self) -> None:
+        try:
+            self._load()
+        except Exception as e:
+            print(f"Background refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def get(self) -> Any:
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    return self._load()
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self.refresh(background=True)
+        return self._value
+
+    def refresh(self, background: bool = True) -> None:
+        if not background:
+            with self._lock:
+                self._load()
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_load, daemon=True).start()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+            self._loaded_at = 0.0
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with optional per-entry expiry after `ttl` seconds."""
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution of `fn`."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+class BatchMemo:
+    """
+    Runs `fn` once per key for the lifetime of one batch; callers arriving
+    while it runs wait for that result. Failures are not remembered.
+    """
+
+    def __init__(self):
+        self._results: Dict[Hashable, Any] = {}
+        self._flight = SingleFlight()
+        self.calls = 0
+        self.computed = 0
+
+    def get(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        self.calls += 1
+        if key in self._results:
+            return self._results[key]
+
+        def run() -> Any:
+            self.computed += 1
+            value = fn()
+            self._results[key] = value
+            return value
+
+        return self._flight.do(key, run)
+
+    def stats(self) -> Dict[str, int]:
+        return {"computed": self.computed, "reused": self.calls - self.computed}
@@ -0,0 +1,93 @@
+# backend/semantic_cache.py
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+RAG_CACHE_THRESHOLD = float(os.getenv("RAG_CACHE_THRESHOLD", "0.92"))
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "512"))
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", "3600"))
+
+Period = Tuple[Optional[int], Optional[int]]
+# (year, quarter) filters, then the period named in the question text
+FilterKey = Tuple[Period, Period]
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by question meaning rather than exact text.
+    A lookup embeds the question and returns the stored answer of the most
+    similar cached question with the same (year, quarter) filters, provided
+    the cosine similarity reaches `threshold`. Questions that differ only in
+    the period they name embed almost identically, so `period` (question ->
+    (year, quarter)) is part of the key too. Entries are evicted LRU once
+    `max_entries` is reached and expire after `ttl` seconds.
+    """
+
+    def __init__(self, encode: Callable[[str], Any], threshold: float = RAG_CACHE_THRESHOLD,
+                 max_entries: int = RAG_CACHE_SIZE, ttl: float = RAG_CACHE_TTL,
+                 period: Optional[Callable[[str], Period]] = None):
+        self.encode = encode
+        self.period = period
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # entry id -> (filter key, unit vector, value, stored at)
+        self._entries: "OrderedDict[int, Tuple[FilterKey, np.ndarray, Any, float]]" = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.encode(question), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _key(self, question: str, year: Optional[int], quarter: Optional[int]) -> FilterKey:
+        return (year, quarter), (self.period(question) if self.period else (None, None))
+
+    def _expire(self, now: float) -> None:
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry[3] > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+    def lookup(self, question: str, year: Optional[int] = None,
+               quarter: Optional[int] = None) -> Tuple[Optional[Any], np.ndarray]:
+        """Return (cached value or None, question vector); pass the vector back to store()."""
+        vector = self.embed(question)
+        key = self._key(question, year, quarter)
+        with self._lock:
+            self._expire(time.monotonic())
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry[0] == key]
+            if candidates:
+                scores = np.stack([entry[1] for _, entry in candidates]) @ vector
+                best = int(np.argmax(scores))
+                if float(scores[best]) >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry[2], vector
+            self.misses += 1
+        return None, vector
+
+    def store(self, question: str, value: Any, year: Optional[int] = None, quarter: Optional[int] = None,
+              vector: Optional[np.ndarray] = None) -> None:
+        if vector is None:
+            vector = self.embed(question)
+        key = self._key(question, year, quarter)
+        with self._lock:
+            self._entries[next(self._ids)] = (key, vector, value, time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -0,0 +1,231 @@
+# backend/telemetry.py
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Seconds; covers in-process cache hits up to slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{self._format_labels(key)} {value:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts with a trailing +Inf slot, sum, count)
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {total:g}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time: `collect` returns (labels, value) pairs for the current state."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...],
+                 collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]]):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        try:
+            samples = sorted((self._key(labels), value) for labels, value in self.collect() if value is not None)
+        except Exception as e:
+            # One broken source must not take /metrics down
+            print(f"Metric {self.name} unavailable: {e}")
+            return lines
+        for key, value in samples:
+            lines.append(f"{self.name}{self._format_labels(key)} {value:g}")
+        return lines
+
+
+_metrics: Dict[str, _Metric] = {}
+_metrics_lock = threading.Lock()
+
+def _register(metric: _Metric) -> Any:
+    with _metrics_lock:
+        # Re-importing a module must not create a second series with the same name
+        return _metrics.setdefault(metric.name, metric)
+
+def counter(name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help_text, labelnames))
+
+def histogram(name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+def gauge(name: str, help_text: str, labelnames: Tuple[str, ...],
+          collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]]) -> Gauge:
+    return _register(Gauge(name, help_text, labelnames, collect))
+
+def render_metrics() -> str:
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+STAGE_LATENCY = histogram("nvidia_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",))
+STAGE_ERRORS = counter("nvidia_stage_errors_total", "Stages that raised an exception.", ("stage",))
+LLM_TOKENS = counter("nvidia_llm_prompt_tokens_total", "Prompt tokens sent to each model (count_tokens).", ("model",))
+LLM_COST = counter("nvidia_llm_cost_usd_total", "Estimated prompt cost from MODEL_PRICES.", ("model",))
+CACHE_REQUESTS = counter("nvidia_cache_requests_total", "Cache lookups by cache and outcome.", ("cache", "result"))
+HTTP_REQUESTS = counter("nvidia_http_requests_total", "HTTP requests by route and status.", ("route", "status"))
+HTTP_LATENCY = histogram("nvidia_http_request_duration_seconds", "HTTP request latency by route.", ("route",))
+
+
+class Trace:
+    """The spans recorded while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        totals: Dict[str, float] = {}
+        for s in spans:
+            totals[s["name"]] = round(totals.get(s["name"], 0.0) + s["duration_ms"], 2)
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+                "stages_ms": totals, "spans": spans}
+
+_current_trace: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar("trace", default=None)
+_current_span: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("span", default=None)
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+def attach_trace(trace: Optional[Trace]) -> None:
+    # For the first line of a new task, whose context is discarded when it finishes
+    _current_trace.set(trace)
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Dict[str, Any]]:
+    """
+    Time a stage: always observed in nvidia_stage_duration_seconds, and added
+    to the current request's trace when there is one. Callers may add
+    attributes to the yielded dict while the span is open.
+    """
+    attributes = dict(attributes)
+    parent_token = _current_span.set(name)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = type(e).__name__
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _current_span.reset(parent_token)
+        parent = _current_span.get()
+        STAGE_LATENCY.observe(duration, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            record = {"name": name, "start_ms": round((started - trace.started) * 1000, 2),
+                      "duration_ms": round(duration * 1000, 2), "thread": threading.current_thread().name}
+            if parent:
+                record["parent"] = parent
+            if attributes:
+                record["attributes"] = attributes
+            if error:
+                record["error"] = error
+            trace.add(record)
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def record_llm_usage(model: str, tokens: int, cost: float) -> None:
+    LLM_TOKENS.inc(tokens, model=model)
+    LLM_COST.inc(cost, model=model)
+
+def in_context(fn: Callable, *args, **kwargs) -> Callable[[], Any]:
+    # Executor threads don't inherit contextvars; carry the caller's trace across explicitly
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn, *args, **kwargs)
+
@@ -0,0 +1,37 @@
+# backend/tests/test_agent_deadlines.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import report_builder
+
+
+def test_queue_time_counts_against_agent_timeout(monkeypatch):
+    # One worker, three reports: the two queued behind the slow one must time out on schedule
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="test-rag")
+    monkeypatch.setitem(report_builder._agent_executors, "rag", pool)
+    release = threading.Event()
+    started = []
+
+    def slow_runner(question, year, quarter, top_k):
+        started.append(question)
+        release.wait(2)
+        return {"historical": "late"}
+
+    async def run_three():
+        return await asyncio.gather(*[
+            report_builder.run_agent("rag", f"q{i}", None, None, timeout=0.5, runners={"rag": slow_runner})
+            for i in range(3)
+        ])
+
+    began = time.perf_counter()
+    sections = asyncio.run(run_three())
+    elapsed = time.perf_counter() - began
+    release.set()
+    pool.shutdown(wait=True)
+
+    assert elapsed < 1.0
+    assert all(s["missing_agents"] == {"rag": "timed out after 0.5s"} for s in sections)
+    # Calls still queued when their report gave up never ran
+    assert started == ["q0"]
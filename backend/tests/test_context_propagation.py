@@ -0,0 +1,48 @@
+# backend/tests/test_context_propagation.py
+import threading
+
+import numpy as np
+
+import pinecone_embeds
+import rag_agent
+from llm_providers import deadline, time_left
+from telemetry import start_trace
+
+
+def test_map_calls_keep_request_deadline_and_spans(monkeypatch):
+    seen = []
+
+    def fake_llm(pdf_data, question, model):
+        seen.append((threading.current_thread().name, time_left(None)))
+        return {"answer": "summary"}
+
+    monkeypatch.setattr(rag_agent, "get_llm_response", fake_llm)
+    monkeypatch.setattr(rag_agent, "group_chunks", lambda chunks, model, tokens: [[c] for c in chunks])
+    with start_trace() as trace, deadline(30):
+        rag_agent.map_summaries({"question": "q", "chunks": ["a", "b", "c"]})
+
+    assert len(seen) == 3
+    assert all(name.startswith("rag-map") and 0 < left <= 30 for name, left in seen)
+    map_spans = [s for s in trace.spans if s["name"] == "rag.map_call"]
+    assert len(map_spans) == 3
+    assert all(s["parent"] == "rag.map" for s in map_spans)
+
+
+def test_namespace_queries_keep_request_deadline_and_spans(monkeypatch):
+    seen = []
+
+    class FakeIndex:
+        def query(self, namespace, **kwargs):
+            seen.append(time_left(None))
+            return {"matches": [{"id": namespace, "score": 1.0}]}
+
+    monkeypatch.setattr(pinecone_embeds, "get_index_handle", lambda: FakeIndex())
+    monkeypatch.setattr(pinecone_embeds, "query_namespaces", lambda year, quarter: ["2024-Q1", "2024-Q2"])
+    monkeypatch.setattr(pinecone_embeds.embedding_service, "encode", lambda text: np.ones(4, dtype=np.float32))
+    with start_trace() as trace, deadline(30):
+        result = pinecone_embeds.query_pinecone("q", top_k=5, year=2024)
+
+    assert {m["id"] for m in result["matches"]} == {"2024-Q1", "2024-Q2"}
+    assert len(seen) == 2 and all(left is not None and 0 < left <= 30 for left in seen)
+    assert sorted(s["attributes"]["namespace"] for s in trace.spans if s["name"] == "vector_query") \
+        == ["2024-Q1", "2024-Q2"]
@@ -0,0 +1,39 @@
+# backend/tests/test_query_router.py
+import numpy as np
+import pytest
+
+import query_router
+from query_router import extract_period
+
+
+@pytest.mark.parametrize("question, period", [
+    ("Revenue in Q1 2024", (2024, 1)),
+    ("How did FY2024 compare?", (2024, None)),
+    ("Gross margin in the fourth quarter of 2023", (2023, 4)),
+    ("Data center revenue 1Q24", (2024, 1)),
+    ("Market cap in Q2 2024 vs 2023", (2024, 2)),
+    ("What did the 10-K 2023 say about risk factors?", (2023, None)),
+    ("What happened in 2022?", (2022, None)),
+])
+def test_extract_period(question, period):
+    assert extract_period(question) == period
+
+
+@pytest.mark.parametrize("question", [
+    "NVIDIA has 2000 engineers working on CUDA",
+    "A team of 2000 engineers in Santa Clara",
+    "Why did NVIDIA ship 2048 GPUs to one customer?",
+    "What is the H100's 1980 MHz boost clock?",
+])
+def test_counts_are_not_years(question):
+    assert extract_period(question) == (None, None)
+
+
+def test_similarity_scores_leave_the_cached_embedding_alone(monkeypatch):
+    cached = np.array([3.0, 4.0], dtype=np.float32)
+    monkeypatch.setattr(query_router.embedding_service, "encode", lambda text: cached)
+    monkeypatch.setattr(query_router, "_example_vectors",
+                        lambda: {intent: np.eye(2, dtype=np.float32) for intent in query_router.INTENTS})
+    scores = query_router.similarity_scores("q")
+    assert scores["rag"] == pytest.approx(0.8)
+    np.testing.assert_array_equal(cached, [3.0, 4.0])
@@ -0,0 +1,394 @@
+# backend/vector_store.py
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# VECTOR_BACKEND=local serves retrieval from an on-disk NumPy index instead of Pinecone
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+LOCAL_INDEX_QUANTIZE = os.getenv("LOCAL_INDEX_QUANTIZE", "float32").lower()  # float32 | int8
+
+# Integer metadata fields kept as NumPy columns, so filters on them are one vectorized mask
+INDEXED_FIELDS = ("year", "quarter")
+# Column value for records without the field
+_MISSING = np.iinfo(np.int64).min
+
+# Any object with these methods can sit behind query_pinecone/upsert_embeddings;
+# a Pinecone Index handle already matches, LocalVectorStore mirrors it:
+#   upsert(vectors=[{"id", "values", "metadata"}, ...], namespace=...)
+#   query(vector=..., top_k=..., include_metadata=..., include_values=..., filter=..., namespace=...) -> {"matches": [...]}
+#   describe_index_stats() -> {"total_vector_count": int, "namespaces": {...}, ...}
+
+
+def _compare(value: Any, op: str, operand: Any) -> bool:
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+def matches_filter(metadata: Dict[str, Any], flt: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one record."""
+    if not flt:
+        return True
+    for key, condition in flt.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def _integral(value: Any) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool) \
+        and float(value).is_integer()
+
+def _column_mask(column: np.ndarray, op: str, operand: Any) -> Optional[np.ndarray]:
+    # None when the condition can't be expressed on an integer column
+    if op in ("$in", "$nin"):
+        if not all(_integral(v) for v in operand):
+            return None
+        found = np.isin(column, np.asarray(list(operand), dtype=np.int64))
+        return found if op == "$in" else ~found
+    if not _integral(operand):
+        return None
+    operand = int(operand)
+    present = column != _MISSING
+    if op == "$eq":
+        return column == operand
+    if op == "$ne":
+        return column != operand
+    if op == "$gt":
+        return present & (column > operand)
+    if op == "$gte":
+        return present & (column >= operand)
+    if op == "$lt":
+        return present & (column < operand)
+    if op == "$lte":
+        return present & (column <= operand)
+    return None
+
+def filter_mask(columns: Dict[str, np.ndarray], flt: Dict[str, Any], size: int) -> Optional[np.ndarray]:
+    """
+    matches_filter over whole columns at once: a boolean row mask, or None
+    if the filter uses a field or operand that isn't column-indexed.
+    """
+    mask = np.ones(size, dtype=bool)
+    for key, condition in flt.items():
+        if key in ("$and", "$or"):
+            parts = [filter_mask(columns, sub, size) for sub in condition]
+            if any(part is None for part in parts):
+                return None
+            if key == "$and":
+                for part in parts:
+                    mask &= part
+            else:
+                mask &= np.logical_or.reduce(parts) if parts else np.zeros(size, dtype=bool)
+            continue
+        column = columns.get(key)
+        if column is None:
+            return None
+        conditions = condition.items() if isinstance(condition, dict) else [("$eq", condition)]
+        for op, operand in conditions:
+            part = _column_mask(column[:size], op, operand)
+            if part is None:
+                return None
+            mask &= part
+    return mask
+
+
+class LocalPartition:
+    """
+    In-process cosine-similarity index persisted under `path`.
+    Vectors are L2-normalised and kept either as float32 or as int8 with a
+    per-row scale; the matrix is memory-mapped on load, and a query is one
+    matrix-vector product plus an argpartition for the top k.
+    """
+
+    def __init__(self, path: str = LOCAL_INDEX_DIR, quantize: str = LOCAL_INDEX_QUANTIZE):
+        self.path = path
+        self.quantize = quantize
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        # Writable, over-allocated copies used between saves; _matrix is a view of the filled rows
+        self._buffer: Optional[np.ndarray] = None
+        self._scale_buffer: Optional[np.ndarray] = None
+        self._dirty = False
+        # INDEXED_FIELDS as columns aligned with _ids; a field holding a non-integer value is dropped
+        self._columns: Dict[str, np.ndarray] = {field: np.empty(0, dtype=np.int64) for field in INDEXED_FIELDS}
+        self._load()
+
+    # ---- persistence ----
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        records_path = self._file("records.json")
+        if not os.path.exists(records_path):
+            return
+        with open(records_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self._ids = records["ids"]
+        self._metadata = records["metadata"]
+        self._row_of = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._index_columns(list(range(len(self._ids))), self._metadata)
+        self._matrix = np.load(self._file("vectors.npy"), mmap_mode="r")
+        if os.path.exists(self._file("scales.npy")):
+            self._scales = np.load(self._file("scales.npy"))
+
+    def _replace(self, name: str, write: Callable[[Any], None], mode: str = "wb") -> None:
+        # Never rewrite a file in place: readers may have it memory-mapped, and touching a
+        # truncated mapping kills the process with SIGBUS. The old inode lives on until unmapped.
+        tmp_path = self._file(f"{name}.{os.getpid()}.tmp")
+        with open(tmp_path, mode, **({"encoding": "utf-8"} if "b" not in mode else {})) as f:
+            write(f)
+        os.replace(tmp_path, self._file(name))
+
+    def _save(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        matrix, scales = self._matrix, self._scales
+        self._replace("vectors.npy", lambda f: np.save(f, matrix))
+        if scales is not None:
+            self._replace("scales.npy", lambda f: np.save(f, scales))
+        # Records last: a reader in another process never sees ids without their vectors
+        self._replace("records.json", lambda f: json.dump({"ids": self._ids, "metadata": self._metadata}, f), "w")
+        # Re-open read-only so the matrix is paged in lazily rather than held in RAM
+        self._matrix = np.load(self._file("vectors.npy"), mmap_mode="r")
+        self._scales = np.array(scales) if scales is not None else None
+        self._buffer = self._scale_buffer = None
+        self._dirty = False
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _reserve(self, rows: int, dim: int, dtype) -> None:
+        # Grow geometrically, so appending batch after batch doesn't copy the whole matrix each time
+        if self._buffer is not None and rows <= len(self._buffer):
+            return
+        capacity = max(rows, 2 * len(self._buffer) if self._buffer is not None else 0, 1024)
+        buffer = np.zeros((capacity, dim), dtype=dtype)
+        scale_buffer = np.ones(capacity, dtype=np.float32) if self.quantize == "int8" else None
+        size = self._matrix.shape[0] if self._matrix is not None else 0
+        if size:
+            buffer[:size] = self._matrix
+            if scale_buffer is not None and self._scales is not None:
+                scale_buffer[:size] = self._scales
+        self._buffer, self._scale_buffer = buffer, scale_buffer
+
+    def _index_columns(self, rows: List[int], metadata: List[Dict[str, Any]]) -> None:
+        for field in list(self._columns):
+            values = [m.get(field) for m in metadata]
+            if not all(v is None or _integral(v) for v in values):
+                # Filters on this field fall back to matches_filter
+                del self._columns[field]
+                continue
+            column = self._columns[field]
+            if len(self._ids) > len(column):
+                grown = np.full(max(len(self._ids), 2 * len(column), 1024), _MISSING, dtype=np.int64)
+                grown[:len(column)] = column
+                column = self._columns[field] = grown
+            column[rows] = [_MISSING if v is None else int(v) for v in values]
+
+    # ---- encoding ----
+    def _encode(self, vectors: np.ndarray):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        unit = vectors / np.where(norms == 0, 1, norms)
+        if self.quantize != "int8":
+            return unit.astype(np.float32), None
+        scales = np.abs(unit).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(unit / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _decode(self, rows) -> np.ndarray:
+        values = np.asarray(self._matrix[rows], dtype=np.float32)
+        if self._scales is not None:
+            values = values * self._scales[rows][:, None]
+        return values
+
+    # ---- Pinecone-compatible API ----
+    def upsert(self, vectors: List[Dict[str, Any]], save: bool = True) -> Dict[str, int]:
+        """Add or replace vectors; with save=False they are queryable now and written on flush()."""
+        if not vectors:
+            return {"upserted_count": 0}
+        encoded, scales = self._encode(np.asarray([v["values"] for v in vectors], dtype=np.float32))
+        with self._lock:
+            rows = []
+            for vector in vectors:
+                row = self._row_of.get(vector["id"])
+                if row is None:
+                    row = self._row_of[vector["id"]] = len(self._ids)
+                    self._ids.append(vector["id"])
+                    self._metadata.append(vector.get("metadata", {}))
+                else:
+                    self._metadata[row] = vector.get("metadata", {})
+                rows.append(row)
+            self._index_columns(rows, [vector.get("metadata", {}) for vector in vectors])
+            total = len(self._ids)
+            self._reserve(total, encoded.shape[1], encoded.dtype)
+            self._buffer[rows] = encoded
+            if self._scale_buffer is not None:
+                self._scale_buffer[rows] = scales
+            self._matrix = self._buffer[:total]
+            self._scales = self._scale_buffer[:total] if self._scale_buffer is not None else None
+            self._dirty = True
+            if save:
+                self._save()
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k: int = 10, include_metadata: bool = True, include_values: bool = False,
+              filter: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            matrix, scales, ids, metadata = self._matrix, self._scales, self._ids, self._metadata
+            columns = dict(self._columns)
+        if matrix is None or not ids or top_k <= 0:
+            return {"matches": []}
+
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        # Concurrent upserts append to ids before swapping the matrix, and another process's
+        # save may leave vectors.npy ahead of records.json; only score rows both cover
+        size = min(matrix.shape[0], len(ids))
+        rows = np.arange(size)
+        if filter:
+            mask = filter_mask(columns, filter, size)
+            if mask is not None:
+                rows = np.flatnonzero(mask)
+            else:
+                rows = np.fromiter((r for r in rows if matches_filter(metadata[r], filter)), dtype=np.int64)
+            if rows.size == 0:
+                return {"matches": []}
+
+        candidates = matrix if rows.size == matrix.shape[0] else matrix[rows]
+        scores = np.asarray(candidates, dtype=np.float32) @ q
+        if scales is not None:
+            scores *= scales[rows]
+
+        k = min(top_k, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        matches = []
+        for i in top:
+            row = int(rows[i])
+            match = {"id": ids[row], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = metadata[row]
+            if include_values:
+                match["values"] = self._decode([row])[0].tolist()
+            matches.append(match)
+        return {"matches": matches}
+
+    def fetch(self, ids: List[str], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            matrix, row_of, metadata = self._matrix, self._row_of, self._metadata
+        if matrix is None:
+            return {"vectors": {}}
+        # Rows appended by an in-flight upsert aren't in this matrix yet
+        found = [(i, row_of[i]) for i in ids if row_of.get(i, matrix.shape[0]) < matrix.shape[0]]
+        if not found:
+            return {"vectors": {}}
+        values = self._decode([row for _, row in found])
+        return {"vectors": {vector_id: {"id": vector_id, "values": values[n].tolist(), "metadata": metadata[row]}
+                            for n, (vector_id, row) in enumerate(found)}}
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        dimension = int(self._matrix.shape[1]) if self._matrix is not None else 0
+        return {"total_vector_count": len(self._ids), "dimension": dimension}
+
+
+class LocalVectorStore:
+    """
+    Namespaced collection of LocalPartitions, mirroring Pinecone namespaces.
+    The default namespace lives directly under `path`; others under
+    `path/namespaces/<name>`, so a namespaced query only scans that partition.
+    """
+
+    def __init__(self, path: str = LOCAL_INDEX_DIR, quantize: str = LOCAL_INDEX_QUANTIZE):
+        self.path = path
+        self.quantize = quantize
+        self._lock = threading.Lock()
+        self._partitions: Dict[str, LocalPartition] = {"": LocalPartition(path, quantize)}
+        self._deferred = 0
+        namespaces_dir = os.path.join(path, "namespaces")
+        if os.path.isdir(namespaces_dir):
+            for name in os.listdir(namespaces_dir):
+                self._partitions[name] = LocalPartition(os.path.join(namespaces_dir, name), quantize)
+
+    def partition(self, namespace: str = "") -> LocalPartition:
+        with self._lock:
+            if namespace not in self._partitions:
+                self._partitions[namespace] = LocalPartition(
+                    os.path.join(self.path, "namespaces", namespace), self.quantize)
+            return self._partitions[namespace]
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "") -> Dict[str, int]:
+        return self.partition(namespace).upsert(vectors, save=not self._deferred)
+
+    @contextmanager
+    def deferred_save(self) -> Iterator[None]:
+        """Upserts inside the block are written to disk once, when the outermost block exits."""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                last = self._deferred == 0
+                partitions = list(self._partitions.values())
+            if last:
+                for partition in partitions:
+                    partition.flush()
+
+    def query(self, vector, top_k: int = 10, namespace: str = "", **kwargs) -> Dict[str, Any]:
+        if namespace not in self._partitions:
+            return {"matches": []}
+        return self._partitions[namespace].query(vector, top_k=top_k, **kwargs)
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> Dict[str, Any]:
+        if namespace not in self._partitions:
+            return {"vectors": {}}
+        return self._partitions[namespace].fetch(ids)
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        namespaces = {
+            name: {"vector_count": part.describe_index_stats()["total_vector_count"]}
+            for name, part in self._partitions.items()
+        }
+        dimension = max((part.describe_index_stats()["dimension"] for part in self._partitions.values()), default=0)
+        return {
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values()),
+            "dimension": dimension,
+            "namespaces": namespaces,
+        }
@@ -0,0 +1,115 @@
+# backend/warmup.py
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from telemetry import HTTP_LATENCY, HTTP_REQUESTS, render_metrics
+
+# WARMUP_BLOCKING=1 holds server startup until warm-up finishes; by default it runs
+# in the background and /readyz reports 503 until it is done
+WARMUP_BLOCKING = os.getenv("WARMUP_BLOCKING", "false").lower() in ("1", "true", "yes")
+
+warm_state: Dict[str, Any] = {"ready": False, "finished": False, "components": {}, "seconds": None}
+_warm_lock = threading.Lock()
+
+
+def _warm_embedding_model() -> None:
+    from pinecone_embeds import embedding_service
+    # One encode pulls the weights into memory, initialises the tokenizer and starts the batcher
+    embedding_service.encode("warm-up")
+
+def _warm_financials_snapshot() -> None:
+    from financials_snapshot import get_snapshot
+    get_snapshot()
+
+def _warm_rag_graph() -> None:
+    from rag_agent import get_rag_graph
+    get_rag_graph()
+
+def _warm_vector_index() -> None:
+    from pinecone_embeds import index_stats
+    index_stats.get()
+
+# (name, step, required for readiness)
+WARMUP_STEPS: List[Tuple[str, Callable[[], None], bool]] = [
+    ("embedding_model", _warm_embedding_model, True),
+    ("financials_snapshot", _warm_financials_snapshot, True),
+    ("rag_graph", _warm_rag_graph, True),
+    # Missing credentials shouldn't keep the rest of the API out of rotation
+    ("vector_index", _warm_vector_index, False),
+]
+
+def warm_up() -> Dict[str, Any]:
+    with _warm_lock:
+        started = time.perf_counter()
+        ready = True
+        for name, step, required in WARMUP_STEPS:
+            step_started = time.perf_counter()
+            try:
+                step()
+                status = {"ok": True}
+            except Exception as e:
+                print(f"Warm-up step '{name}' failed: {e}")
+                status = {"ok": False, "error": str(e)}
+                ready = ready and not required
+            status["seconds"] = round(time.perf_counter() - step_started, 3)
+            warm_state["components"][name] = status
+        warm_state["seconds"] = round(time.perf_counter() - started, 3)
+        warm_state["ready"] = ready
+        warm_state["finished"] = True
+        print(f"Warm-up finished in {warm_state['seconds']}s (ready={ready})")
+        return warm_state
+
+@asynccontextmanager
+async def lifespan(app):
+    from report_jobs import get_job_queue
+    task = asyncio.create_task(asyncio.to_thread(warm_up))
+    if WARMUP_BLOCKING:
+        await task
+    # Starting the queue resumes report jobs a previous process left unfinished
+    jobs = await asyncio.to_thread(get_job_queue)
+    try:
+        yield
+    finally:
+        task.cancel()
+        jobs.shutdown()
+        from charts import chart_service
+        chart_service.shutdown()
+
+
+health_router = APIRouter()
+
+@health_router.get("/healthz")
+def liveness():
+    # The process is up and serving; says nothing about dependencies
+    return {"status": "ok"}
+
+@health_router.get("/readyz")
+def readiness():
+    body = {"ready": warm_state["ready"], "finished": warm_state["finished"],
+            "seconds": warm_state["seconds"], "components": warm_state["components"]}
+    return JSONResponse(body, status_code=200 if warm_state["ready"] else 503)
+
+@health_router.get("/metrics")
+def metrics():
+    # Prometheus text exposition of every histogram and counter in telemetry
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+async def metrics_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series count bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUESTS.inc(route=route, status=status)
+        HTTP_LATENCY.observe(time.perf_counter() - started, route=route)
@@ -0,0 +1,89 @@
+# backend/web_tools.py
+import hashlib
+import json
+import os
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+from llm_providers import time_left
+from resources import LRUCache, SingleFlight, get_or_create
+from telemetry import record_cache, span
+
+load_dotenv()
+
+# WEB_SEARCH_BACKEND=local answers from canned results instead of calling Tavily
+WEB_SEARCH_BACKEND = os.getenv("WEB_SEARCH_BACKEND", "tavily").lower()
+WEB_SEARCH_FIXTURES = os.getenv("WEB_SEARCH_FIXTURES")  # optional JSON {query: [results]}
+WEB_CACHE_TTL = float(os.getenv("WEB_CACHE_TTL", "900"))
+WEB_CACHE_SIZE = int(os.getenv("WEB_CACHE_SIZE", "512"))
+# Per-search HTTP timeout in seconds, shortened to what the caller's deadline leaves
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "20"))
+
+
+class LocalSearchClient:
+    """Deterministic stand-in for TavilyClient.search() for tests and offline runs."""
+
+    def __init__(self, fixtures_path: str = None):
+        self.fixtures: Dict[str, List[Dict[str, Any]]] = {}
+        if fixtures_path:
+            with open(fixtures_path, "r", encoding="utf-8") as f:
+                self.fixtures = {normalize_query(q): results for q, results in json.load(f).items()}
+        self.calls = 0
+
+    def search(self, query: str, max_results: int = 5, **kwargs) -> Dict[str, Any]:
+        self.calls += 1
+        canned = self.fixtures.get(normalize_query(query))
+        if canned is None:
+            digest = hashlib.sha1(normalize_query(query).encode()).hexdigest()[:8]
+            canned = [
+                {
+                    "title": f"Result {i + 1} for {query}",
+                    "url": f"https://example.com/{digest}/{i + 1}",
+                    "content": f"Canned web result {i + 1} about {query}.",
+                    "score": round(1.0 - i * 0.05, 2),
+                }
+                for i in range(max_results)
+            ]
+        return {"query": query, "results": canned[:max_results]}
+
+
+def normalize_query(query: str) -> str:
+    # Case and whitespace differences shouldn't cost another upstream call
+    return " ".join(query.lower().split())
+
+def get_search_client():
+    # One long-lived client (and its HTTP session) per process
+    if WEB_SEARCH_BACKEND == "local":
+        return get_or_create("web_search_client", lambda: LocalSearchClient(WEB_SEARCH_FIXTURES))
+
+    def create():
+        api_key = os.environ.get("TAVILY_API_KEY")
+        if not api_key:
+            raise Exception("TAVILY_API_KEY is not set in the environment.")
+        # Imported here to keep API startup light
+        from tavily import TavilyClient
+        return TavilyClient(api_key=api_key)
+    return get_or_create("web_search_client", create)
+
+_search_cache = LRUCache(WEB_CACHE_SIZE, ttl=WEB_CACHE_TTL)
+_search_flight = SingleFlight()
+
+# Tavily Web Search using TavilyClient
+def tavily_search(query: str, num_results: int = 10) -> list:
+    key = (normalize_query(query), num_results)
+    cached = _search_cache.get(key)
+    record_cache("web_search", cached is not None)
+    if cached is not None:
+        return list(cached)
+
+    def search() -> list:
+        with span("web_search", backend=WEB_SEARCH_BACKEND):
+            response = get_search_client().search(query, max_results=num_results, timeout=time_left(WEB_SEARCH_TIMEOUT))
+        # Assuming the response is a dictionary with a "results" key
+        results = response.get("results", [])
+        _search_cache.put(key, results)
+        return results
+
+    # Concurrent identical searches share one upstream call
+    return list(_search_flight.do(key, search))
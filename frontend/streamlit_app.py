@@ -4,9 +4,19 @@ import streamlit as st
 import requests
 import pandas as pd
 import base64
+import json
+import time
+import uuid
 
-# URL for the FastAPI report endpoint (adjust if running on a different host/port)
-API_URL = "http://34.28.77.168:8000/report"
+import pyarrow as pa
+from requests.adapters import HTTPAdapter
+
+# FastAPI server (adjust if running on a different host/port)
+API_BASE = "http://34.28.77.168:8000"
+API_URL = f"{API_BASE}/report"
+STREAM_URL = f"{API_URL}/stream"
+JOBS_URL = f"{API_URL}/jobs"
+JOB_POLL_SECONDS = 2
 
 st.set_page_config(page_title="NVIDIA Research Assistant", layout="wide")
 st.title("🔍 NVIDIA Multi-Agent Research Assistant")
@@ -22,12 +32,104 @@ st.markdown(
     """
 )
 
+# --- HTTP ---
+@st.cache_resource
+def get_session():
+    # One keep-alive connection pool for every request this Streamlit server makes
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
+
+session = get_session()
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def fetch_artifact(url):
+    # Artifact URLs are content hashes, so a cached body never goes stale
+    response = session.get(url if url.startswith("http") else f"{API_BASE}{url}")
+    response.raise_for_status()
+    return response.content
+
+def load_table(url):
+    return pa.ipc.open_stream(fetch_artifact(url)).read_pandas()
+
 # --- UI Inputs ---
 question = st.text_input("Enter your research question:")
 year = st.selectbox("Year", [None] + list(range(2018, 2025)))
 quarter = st.selectbox("Quarter", [None, 1, 2, 3, 4])
 agents = st.multiselect("Include agents to run:", ["rag", "financial", "web"], default=["rag", "financial", "web"])
 
+# --- Section renderers (shared by the streaming and blocking paths) ---
+def render_historical(container, text):
+    container.subheader("📜 Historical Performance (RAG)")
+    container.write(text)
+
+def render_financial(container, section):
+    container.subheader("💰 Financial Valuation Metrics")
+    # Reports carry the table as an Arrow artifact; older servers inline the records instead
+    if section.get("financial_table_url") or isinstance(section.get("financial_summary"), list):
+        if section.get("financial_table_url"):
+            df_fin = load_table(section["financial_table_url"])
+        else:
+            df_fin = pd.DataFrame(section["financial_summary"])
+        container.dataframe(df_fin)
+        if section.get("financial_chart_url"):
+            chart_bytes = fetch_artifact(section["financial_chart_url"])
+        elif section.get("financial_chart"):
+            # Servers from before the artifact endpoints inline the PNG
+            chart_bytes = base64.b64decode(section["financial_chart"])
+        else:
+            chart_bytes = None
+        if chart_bytes:
+            container.image(chart_bytes, caption="MarketCap Over Time", use_column_width=True)
+    else:
+        container.write(section.get("financial_summary"))
+
+def render_web(container, results):
+    container.subheader("🌐 Real-Time Industry Insights")
+    if isinstance(results, list) and results:
+        df_web = pd.DataFrame(results)
+        container.dataframe(df_web)
+    else:
+        container.write("No web insights available.")
+
+def render_missing(missing):
+    # --- Agents that timed out or failed (partial report) ---
+    for agent, reason in missing.items():
+        st.warning(f"The {agent} agent {reason}; its section is missing from this report.")
+
+def render_section(containers, agent, section):
+    if agent == "rag" and "historical" in section:
+        render_historical(containers["rag"].container(), section["historical"])
+    elif agent == "financial" and "financial_summary" in section:
+        render_financial(containers["financial"], section)
+    elif agent == "web" and "web" in section:
+        render_web(containers["web"], section["web"])
+
+def run_report_job(payload):
+    # Same key for the same payload until its report is shown, so a rerun after a timeout
+    # or reconnect attaches to the running (or finished) job instead of starting over
+    job_keys = st.session_state.setdefault("job_keys", {})
+    payload_key = json.dumps(payload, sort_keys=True)
+    key = job_keys.setdefault(payload_key, str(uuid.uuid4()))
+    response = session.post(JOBS_URL, json=payload, headers={"Idempotency-Key": key})
+    response.raise_for_status()
+    job = response.json()
+    progress_bar = st.progress(0.0)
+    while job["status"] in ("queued", "running"):
+        progress = job.get("progress") or {}
+        if progress.get("agents"):
+            progress_bar.progress(len(progress["completed"]) / len(progress["agents"]))
+        time.sleep(JOB_POLL_SECONDS)
+        response = session.get(f"{JOBS_URL}/{job['job_id']}")
+        response.raise_for_status()
+        job = response.json()
+    progress_bar.progress(1.0)
+    job_keys.pop(payload_key, None)
+    return job
+
+stream_results = st.checkbox("Stream results as they arrive", value=True)
+
 if st.button("Generate Report"):
     if not question:
         st.error("Please enter a research question.")
@@ -38,35 +140,40 @@ if st.button("Generate Report"):
             "quarter": quarter,
             "include_agents": agents
         }
-        with st.spinner("Generating report..."):
-            response = requests.post(API_URL, json=payload)
-        if response.status_code != 200:
-            st.error(f"Error: {response.status_code} - {response.text}")
+        # One slot per agent, in report order, filled in whenever that agent finishes
+        containers = {agent: st.empty() if agent == "rag" else st.container()
+                      for agent in ["rag", "financial", "web"] if agent in agents}
+
+        if stream_results:
+            rag_text = ""
+            with st.spinner("Generating report..."):
+                with session.post(STREAM_URL, json=payload, stream=True) as response:
+                    if response.status_code != 200:
+                        st.error(f"Error: {response.status_code} - {response.text}")
+                    else:
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            event = json.loads(line)
+                            if event["event"] == "token" and "rag" in containers:
+                                rag_text += event["text"]
+                                render_historical(containers["rag"].container(), rag_text)
+                            elif event["event"] == "section":
+                                render_section(containers, event["agent"], event["data"])
+                            elif event["event"] == "done":
+                                render_missing(event.get("missing_agents", {}))
         else:
-            report = response.json()
-            # --- Display RAG (Historical) Output ---
-            if "historical" in report:
-                st.subheader("📜 Historical Performance (RAG)")
-                st.write(report["historical"])
-
-            # --- Display Financial Metrics ---
-            if "financial_summary" in report:
-                st.subheader("💰 Financial Valuation Metrics")
-                if isinstance(report["financial_summary"], list):
-                    df_fin = pd.DataFrame(report["financial_summary"])
-                    st.dataframe(df_fin)
-                    chart_b64 = report.get("financial_chart", "")
-                    if chart_b64:
-                        chart_bytes = base64.b64decode(chart_b64)
-                        st.image(chart_bytes, caption="MarketCap Over Time", use_column_width=True)
-                else:
-                    st.write(report["financial_summary"])
-
-            # --- Display Web Insights ---
-            if "web" in report:
-                st.subheader("🌐 Real-Time Industry Insights")
-                if isinstance(report["web"], list) and report["web"]:
-                    df_web = pd.DataFrame(report["web"])
-                    st.dataframe(df_web)
+            # Runs as a background job on the API, so long reports outlive HTTP timeouts
+            try:
+                with st.spinner("Generating report..."):
+                    job = run_report_job(payload)
+            except requests.RequestException as e:
+                st.error(f"Error: {e}")
+            else:
+                if job["status"] != "succeeded":
+                    st.error(f"Error: report job {job['status']} - {job.get('error')}")
                 else:
-                    st.write("No web insights available.")
+                    report = job["result"]
+                    render_missing(report.get("missing_agents", {}))
+                    for agent in containers:
+                        render_section(containers, agent, report)